@@ -69,22 +69,22 @@ class CrazyCC(qtb.CalibrateClassification):
         Here we add all PI gate to our sequence program based on level_stop.
         We will use R4 to represent level and jlt instruction to skip later PI gate.
         """
-        for tone in self.tones: self.sequences[tone]['program'] += """
+        for tone in self.tones: self.sequences[tone]['program_parts'].append("""
                 #-----------Main-----------
                     jlt              R4,1,@end_main    
-        """         
+        """)         
 
         for level in range(self.x_stop):
             gate = {q: [f'X180_{level}{level+1}'] for q in self.drive_qubits} if level != 5 else {'Q4': [f'X180_01']}
             self.add_gate(gate, name=f'XPI{level}{level+1}')
             
-            for tone in self.tones: self.sequences[tone]['program'] += f"""
+            for tone in self.tones: self.sequences[tone]['program_parts'].append(f"""
                     jlt              R4,{level+2},@end_main    
-        """
+        """)
             
-        for tone in self.tones: self.sequences[tone]['program'] += """
+        for tone in self.tones: self.sequences[tone]['program_parts'].append("""
         end_main:   add              R4,1,R4    
-        """
+        """)
 
 
 cal_0123 = qtb.CalibrateClassification(cfg, drive_qubits, readout_resonators='R2', 
@@ -304,15 +304,15 @@ class RB1QB(RB1QBBase):
             freq = round((tone_dict['mod_freq'] + tone_dict['pulse_detuning']) * 4)
             
             program = replace_except_nth_occurrence(
-                string=self.sequences[tone]['program'],
+                string=self.join_program(tone),
                 substring=f'                    set_freq         {freq}\n',
                 new_substring='',
                 n=0)
 
-            self.sequences[tone]['program'] = remove_identical_neighbor_pattern(
+            self.sequences[tone]['program_parts'] = [remove_identical_neighbor_pattern(
                 string=program,
                 pattern='[ \t]+set_awg_gain.*\n'
-            )
+            )]
 
 
     def normalize_subspace_population(self, subspace: str | list[str] = None, dpi: int = 150):
@@ -397,16 +397,16 @@ class RB1QBDetuningSweep(RB1QBBase, Spectroscopy):
 
         # Add x_value
         for tone in self.main_tones:
-            self.sequences[tone]['program'] += f"""
+            self.sequences[tone]['program_parts'].append(f"""
                     add              R4,{self.frequency_translator(self.x_step)},R4
-            """
+            """)
 
             tone_dict = self.cfg[f'variables.{tone}']
             freq = round((tone_dict['mod_freq'] + tone_dict['pulse_detuning']) * 4)
 
             old_str = f'set_freq         {freq}'
             new_str = f'set_freq         R4'
-            self.sequences[tone]['program'] = self.sequences[tone]['program'].replace(old_str, new_str)
+            self.sequences[tone]['program_parts'] = [self.join_program(tone).replace(old_str, new_str)]
 
 
 class RB1QBAmp180Sweep(RB1QBBase):
@@ -471,10 +471,10 @@ class RB1QBAmp180Sweep(RB1QBBase):
             start = self.gain_translator(self.x_start)
             DRAG_start = self.gain_translator(self.x_start * self.cfg[f'variables.{tone}/DRAG_weight'])
 
-            self.sequences[tone]['program'] += f"""
+            self.sequences[tone]['program_parts'].append(f"""
                     move             {start},R4     
                     move             {DRAG_start},R11
-            """
+            """)
 
 
     def add_main(self):
@@ -501,16 +501,16 @@ class RB1QBAmp180Sweep(RB1QBBase):
             step = self.gain_translator(self.x_step)
             DRAG_step = self.gain_translator(self.x_step * tone_dict['DRAG_weight'])
 
-            self.sequences[tone]['program'] += f"""
+            self.sequences[tone]['program_parts'].append(f"""
                     add              R4,{step},R4
                     add              R11,{DRAG_step},R11
-            """
+            """)
 
             gain_180 = round(tone_dict['amp_180'] * 32768)
             drag_180 = round(gain_180 * tone_dict['DRAG_weight'])
             old_str_180 = f'set_awg_gain     {gain_180},{drag_180}'
             new_str_180 = f'set_awg_gain     R4,R11'
-            self.sequences[tone]['program'] = self.sequences[tone]['program'].replace(old_str_180, new_str_180)
+            self.sequences[tone]['program_parts'] = [self.join_program(tone).replace(old_str_180, new_str_180)]
 
 
 
@@ -580,12 +580,12 @@ class RB1QBAmp90Sweep(RB1QBBase):
             DRAG_start = self.gain_translator(self.x_start * DRAG_weight)
             DRAG_start_neg = self.gain_translator(-1 * self.x_start * DRAG_weight)
 
-            self.sequences[tone]['program'] += f"""
+            self.sequences[tone]['program_parts'].append(f"""
                     move             {start},R4     
                     move             {start_neg},R11
                     move             {DRAG_start},R12
                     move             {DRAG_start_neg},R13
-            """
+            """)
 
 
     def add_main(self):
@@ -615,24 +615,24 @@ class RB1QBAmp90Sweep(RB1QBBase):
             DRAG_step = self.gain_translator(self.x_step * tone_dict['DRAG_weight'])
             DRAG_step_neg = self.gain_translator(-1 * self.x_step * tone_dict['DRAG_weight'])
 
-            self.sequences[tone]['program'] += f"""
+            self.sequences[tone]['program_parts'].append(f"""
                     add              R4,{step},R4
                     add              R11,{step_neg},R11
                     add              R12,{DRAG_step},R12
                     add              R13,{DRAG_step_neg},R13
-            """
+            """)
 
             gain_90 = round(tone_dict['amp_90'] * 32768)
             drag_90 = round(gain_90 * tone_dict['DRAG_weight'])
             old_str_90 = f'set_awg_gain     {gain_90},{drag_90}'
             new_str_90 = f'set_awg_gain     R4,R12'
-            self.sequences[tone]['program'] = self.sequences[tone]['program'].replace(old_str_90, new_str_90)
+            self.sequences[tone]['program_parts'] = [self.join_program(tone).replace(old_str_90, new_str_90)]
 
             gain_90n = round(-1 * tone_dict['amp_90'] * 32768)
             drag_90n = round(gain_90n * tone_dict['DRAG_weight'])
             old_str_90n = f'set_awg_gain     {gain_90n},{drag_90n}'
             new_str_90n = f'set_awg_gain     R11,R13'
-            self.sequences[tone]['program'] = self.sequences[tone]['program'].replace(old_str_90n, new_str_90n)
+            self.sequences[tone]['program_parts'] = [self.join_program(tone).replace(old_str_90n, new_str_90n)]
 
 
 class RB1QBDRAGWeightSweep(RB1QBBase):
@@ -704,14 +704,14 @@ class RB1QBDRAGWeightSweep(RB1QBBase):
             start_half = self.gain_translator(tone_dict['amp_90'] * self.x_start)
             start_half_neg = self.gain_translator(-1 * tone_dict['amp_90'] * self.x_start)
 
-            self.sequences[tone]['program'] += f"""
+            self.sequences[tone]['program_parts'].append(f"""
                     move             {start},R4     
                     move             {start_half},R11
                     move             {start_half_neg},R12
                     move             {gain_180},R13
                     move             {gain_90},R14
                     move             {gain_90n},R15
-            """
+            """)
 
 
     def add_main(self):
@@ -739,26 +739,26 @@ class RB1QBDRAGWeightSweep(RB1QBBase):
             step_half = self.gain_translator(tone_dict['amp_90'] * self.x_step)
             step_half_neg = self.gain_translator(-1 * tone_dict['amp_90'] * self.x_step)
 
-            self.sequences[tone]['program'] += f"""
+            self.sequences[tone]['program_parts'].append(f"""
                     add              R4,{step},R4
                     add              R11,{step_half},R11
                     add              R12,{step_half_neg},R12
-            """
+            """)
 
             gain_180 = round(tone_dict['amp_180'] * 32768)
             drag_180 = round(gain_180 * tone_dict['DRAG_weight'])
             old_str_180 = f'set_awg_gain     {gain_180},{drag_180}'
             new_str_180 = f'set_awg_gain     R13,R4'
-            self.sequences[tone]['program'] = self.sequences[tone]['program'].replace(old_str_180, new_str_180)
+            self.sequences[tone]['program_parts'] = [self.join_program(tone).replace(old_str_180, new_str_180)]
 
             gain_90 = round(tone_dict['amp_90'] * 32768)
             drag_90 = round(gain_90 * tone_dict['DRAG_weight'])
             old_str_90 = f'set_awg_gain     {gain_90},{drag_90}'
             new_str_90 = f'set_awg_gain     R14,R11'
-            self.sequences[tone]['program'] = self.sequences[tone]['program'].replace(old_str_90, new_str_90)
+            self.sequences[tone]['program_parts'] = [self.join_program(tone).replace(old_str_90, new_str_90)]
 
             gain_90n = round(-1 * tone_dict['amp_90'] * 32768)
             drag_90n = round(gain_90n * tone_dict['DRAG_weight'])
             old_str_90n = f'set_awg_gain     {gain_90n},{drag_90n}'
             new_str_90n = f'set_awg_gain     R15,R12'
-            self.sequences[tone]['program'] = self.sequences[tone]['program'].replace(old_str_90n, new_str_90n)
\ No newline at end of file
+            self.sequences[tone]['program_parts'] = [self.join_program(tone).replace(old_str_90n, new_str_90n)]
\ No newline at end of file
@@ -6,14 +6,19 @@ import pandas as pd
 import matplotlib.pyplot as plt
 import qtrlb.utils.units as u
 from copy import deepcopy
+from concurrent.futures import ThreadPoolExecutor
 from matplotlib.offsetbox import AnchoredText
 from lmfit import Model
 from qtrlb.config.config import MetaManager
 from qtrlb.utils.tone_utils import tone_to_qudit, find_subtones, split_subspace
-from qtrlb.utils.waveforms import get_waveform
-from qtrlb.utils.pulses import dict_to_DataFrame, gate_transpiler, pulse_interpreter
+from qtrlb.utils.waveforms import get_waveform_cached
+from qtrlb.utils.pulses import dict_to_DataFrame, pad_gate_dict, gate_transpiler, pulse_interpreter, idle_program
 from qtrlb.processing.fitting import fit
-from qtrlb.processing.plotting import COLOR_LIST, plot_IQ
+from qtrlb.processing.plotting import COLOR_LIST, plot_IQ, get_IQ_limits
+try:
+    import orjson
+except ModuleNotFoundError:
+    orjson = None
 
 
 
@@ -90,8 +95,8 @@ class Scan:
         self.classification_enable = self.cfg.variables['common/classification']
         self.heralding_enable = self.cfg.variables['common/heralding']
         self.customized_data_process = self.cfg.variables['common/customized_data_process']
-        self.x_values = np.linspace(self.x_start, self.x_stop, self.x_points)
-        self.x_step = (self.x_stop - self.x_start) / (self.x_points-1) if self.x_points != 1 else 0 
+        self.x_values, x_step = np.linspace(self.x_start, self.x_stop, self.x_points, retstep=True)
+        self.x_step = float(x_step) if self.x_points != 1 else 0 
         self.num_bins = self.n_seqloops * self.x_points
         self.jsons_path = os.path.join(self.cfg.working_dir, 'Jsons')
         
@@ -211,6 +216,37 @@ class Scan:
         return [readout_tone.replace('/', '_') for readout_tone in self.readout_tones]
 
 
+    @property
+    def gate_df(self):
+        """
+        Pandas DataFrame of all gates added to sequence with concat_df, for user to read/check gates.
+        It's only built when we ask for it. Sequence will be correctly generated even without it.
+        All columns share one categorical dtype since there are only a few distinct gate strings.
+        """
+        gate_df = pd.concat([dict_to_DataFrame(dic={}, name='', rows=self.qudits)] 
+                            + [dict_to_DataFrame(gate, name, self.qudits) for name, gate in self.gate_tables], axis=1)
+        return self.to_categorical(gate_df)
+
+
+    @property
+    def pulse_df(self):
+        """
+        Pandas DataFrame of all pulses added to sequence with concat_df, for user to read/check pulses.
+        """
+        pulse_df = pd.concat([dict_to_DataFrame(dic={}, name='', rows=self.tones)] 
+                             + [dict_to_DataFrame(pulse, name, self.tones) for name, pulse in self.pulse_tables], axis=1)
+        return self.to_categorical(pulse_df)
+
+
+    @staticmethod
+    def to_categorical(dataframe: pd.DataFrame) -> pd.DataFrame:
+        """
+        Convert all columns of a gate/pulse DataFrame to one shared categorical dtype.
+        Each cell becomes a small integer code instead of a pointer to Python string.
+        """
+        return dataframe.astype(pd.CategoricalDtype(pd.unique(dataframe.values.ravel())))
+
+
     def make_tones_list(self):
         """
         Generate list attribute self.tones from existing attributes.
@@ -285,6 +321,11 @@ class Scan:
                          'acquisitions': acquisitions,
                          'program': seq_prog}
         
+        During make_sequence, the program is kept as list of string fragments in 'program_parts'.
+        They will be joined into 'program' in save_sequence to avoid repeated string concatenation.
+        The sequence dictionary is kept as plain dict since it's exactly what we dump and upload.
+        In hot loops, please bind the 'program_parts' list to a local name once, like add_pulse does.
+
         Please check the link below for detail:
         https://qblox-qblox-instruments.readthedocs-hosted.com/en/master/tutorials/basic_sequencing.html
 
@@ -293,10 +334,10 @@ class Scan:
         This bring you flexibility on qutrit and qudit experiment, for example qutrit Rz gate.
         Please check the VariableManager and DACManager about varman['tones'] for more details.
         """
-        # Gate and pulse dataframe for user to read/check gates.
+        # Gate and pulse tables behind self.gate_df and self.pulse_df for user to read/check gates.
         # Sequence will be correctly generated even without it.
-        self.gate_df = dict_to_DataFrame(dic={}, name='', rows=self.qudits)
-        self.pulse_df = dict_to_DataFrame(dic={}, name='', rows=self.tones)
+        self.gate_tables = []
+        self.pulse_tables = []
 
         self.sequences = {tone: {} for tone in self.tones}        
         self.set_waveforms_acquisitions()
@@ -331,9 +372,9 @@ class Scan:
                 length = self.qubit_pulse_length_ns
                 shape = self.cfg.variables[f'{tone}/pulse_shape']
 
-                waveforms = {'1qMAIN': {'data': get_waveform(length, shape, **waveform_kwargs), 
+                waveforms = {'1qMAIN': {'data': get_waveform_cached(length, shape, **waveform_kwargs), 
                                         'index': 0},
-                             '1qDRAG': {'data': get_waveform(length, shape+'_derivative', **waveform_kwargs), 
+                             '1qDRAG': {'data': get_waveform_cached(length, shape+'_derivative', **waveform_kwargs), 
                                         'index': 1}}
                 acquisitions = {}
             
@@ -341,7 +382,7 @@ class Scan:
                 length = self.resonator_pulse_length_ns
                 shape = self.cfg.variables[f'{tone}/pulse_shape']
 
-                waveforms = {'RO': {'data': get_waveform(length, shape, **waveform_kwargs), 
+                waveforms = {'RO': {'data': get_waveform_cached(length, shape, **waveform_kwargs), 
                                     'index': 0}}
                 
                 acquisitions = {'readout':   {'num_bins': self.num_bins, 'index': 0}}
@@ -373,9 +414,9 @@ class Scan:
                 length = round(pulse_dict.pop('length') * 1e9)
                 shape = pulse_dict.pop('pulse_shape')
 
-                waveforms = {f'{gate}MAIN': {'data': get_waveform(length, shape, **pulse_dict),
+                waveforms = {f'{gate}MAIN': {'data': get_waveform_cached(length, shape, **pulse_dict),
                                              'index': pulse_dict['waveform_index']},
-                             f'{gate}DRAG': {'data': get_waveform(length, shape+'_derivative', **pulse_dict),
+                             f'{gate}DRAG': {'data': get_waveform_cached(length, shape+'_derivative', **pulse_dict),
                                              'index': pulse_dict['waveform_index'] + 1}}
 
                 self.sequences[tone]['waveforms'].update(waveforms)
@@ -385,9 +426,12 @@ class Scan:
         """
         Create sequence program and initialize some built-in registers.
         Please do not change the convention here since their function have been hardcoded later.
+        It also resets self.pulse_programs and self.transpiled_gates, the memos used by add_pulse and add_gate.
         """
-        for tone in self.tones:
-            program = f"""
+        self.pulse_programs = {}
+        self.transpiled_gates = {}
+
+        program = f"""
         # R0 count n_seqloops, descending.
         # R1 count bin for acquisition, ascending.
         # R2 qubit relaxation time in microseconds, descending.
@@ -402,7 +446,7 @@ class Scan:
                     move             {self.n_seqloops},R0
                     move             0,R1
         """
-            self.sequences[tone]['program'] = program
+        for tone in self.tones: self.sequences[tone]['program_parts'] = [program]
             
             
     def start_loop(self):
@@ -422,9 +466,9 @@ class Scan:
         """
         Add seq_loop to sequence program.
         """
-        for tone in self.tones: self.sequences[tone]['program'] += """
+        for tone in self.tones: self.sequences[tone]['program_parts'].append("""
         seq_loop:   
-        """
+        """)
         
      
     def add_xinit(self):
@@ -432,31 +476,32 @@ class Scan:
         Set necessary initial value of x parameter to the registers, especially R3 & R4. 
         Child class can super this method to add more initial values.
         """
-        for tone in self.tones: self.sequences[tone]['program'] += f"""
+        xinit = f"""
                     move             {self.x_points},R3    
         """
+        for tone in self.tones: self.sequences[tone]['program_parts'].append(xinit)
         
         
     def add_xloop(self):
         """
         Add x_loop to sequence program.
         """
-        for tone in self.tones: self.sequences[tone]['program'] += """            
+        for tone in self.tones: self.sequences[tone]['program_parts'].append("""            
         xpt_loop: 
-        """
+        """)
         
         
     def add_sequence_start(self):
         """
         Add sync and phase resetting instruction to sequence program.
         """
-        for tone in self.tones: self.sequences[tone]['program'] += """     
+        for tone in self.tones: self.sequences[tone]['program_parts'].append("""     
                 #-----------Start-----------
                     wait_sync        8               # Sync at beginning of the loop.
                     reset_ph                         # Reset phase to eliminate effect of previous VZ gate.
                     set_mrk          15              # Enable all markers (binary 1111) for switching on output.
                     upd_param        8               # Update parameters and wait 8ns.
-        """
+        """)
             
         
     def add_relaxation(self, label: str | int = ''):
@@ -476,7 +521,7 @@ class Scan:
         rlx_loop{label}:   wait             1000
                     loop             R2,@rlx_loop{label}
         """
-        for tone in self.tones: self.sequences[tone]['program'] += relaxation
+        for tone in self.tones: self.sequences[tone]['program_parts'].append(relaxation)
         
         
     def add_heralding(self, name: str = 'Heralding', add_label: bool = True, 
@@ -528,32 +573,32 @@ class Scan:
         """
         Count next acquisition bin (R1) and turn off all output.
         """
-        for tone in self.tones: self.sequences[tone]['program'] += """
+        for tone in self.tones: self.sequences[tone]['program_parts'].append("""
                 #-----------Stop-----------
                     add              R1,1,R1
                     set_mrk          0               # Disable all markers (binary 0000) for switching off output.
                     upd_param        8               # Update parameters and wait 4ns.     
-        """
+        """)
         
 
     def end_xloop(self):
         """
         Add end of x loop.
         """
-        for tone in self.tones: self.sequences[tone]['program'] += """
+        for tone in self.tones: self.sequences[tone]['program_parts'].append("""
                     loop             R3,@xpt_loop         
-        """
+        """)
         
         
     def end_seqloop(self):
         """
         End sequence loop and stop the sequence program.
         """
-        for tone in self.tones: self.sequences[tone]['program'] += """
+        for tone in self.tones: self.sequences[tone]['program_parts'].append("""
                     loop             R0,@seq_loop
                     
                     stop             
-        """
+        """)
 
 
     def add_wait(self, name: str, length: int, add_label: bool = True,
@@ -564,13 +609,18 @@ class Scan:
         along with a remainder, and use multiple instruction to achieve it.
         Here I treat it as a gate, which means we can add label if we want, \
         and we can see it in self.gate_df
+        Each chunk has to stay in [4, 65535] ns, so a remainder below 4ns borrows 4ns from the chunk before it.
         """
         assert length >= 4, f'The wait time need to be at least 4ns. Now it is {length}.'
+        assert 8 <= divisor_ns <= 65535, f'The divisor_ns need to be in [8, 65535]. Now it is {divisor_ns}.'
         multiple = round(length // divisor_ns)
         remainder = round(length % divisor_ns)
         
         gate = {qudit: ['I' for _ in range(multiple+1)] for qudit in self.qudits}
         lengths = [divisor_ns for _ in range(multiple)] + [remainder]
+        if 0 < remainder < 4: 
+            lengths[-2] -= 4
+            lengths[-1] += 4
         self.add_gate(gate, name, lengths, add_label=add_label, concat_df=concat_df)
     
             
@@ -578,8 +628,8 @@ class Scan:
                  add_label: bool = True, concat_df: bool = True, **pulse_kwargs):
         """
         The general method for adding gates to sequence.
-        We will generate the Pandas DataFrame of pre_gate, post_gate, readout, with padded 'I'.
-        All qubits and resonators will become the (row) index of dataframe.
+        We will generate the padded dictionary of pre_gate, post_gate, readout, with padded 'I'.
+        All qubits and resonators will become the row of it, which is also the (row) index of self.gate_df.
         An additional interger attribute 'length' in [ns] will be associated with each column.
         If lengths is shorter than number of gate, it will be padded using the last length.
         Please remember all labels created in Q1ASM should have different names.
@@ -606,38 +656,65 @@ class Scan:
         However, pulse_df will have 'H3_01' in 'Q3/01' and 'H3_12' in 'Q3/12'.
         These two pulses are in same column but different rows, so same moment but different sequencers.
         """
-        gate_df = dict_to_DataFrame(gate, name, self.qudits)  # Each row is a qudit.
+        # Same gate (readout and heralding, for example) will only be padded and transpiled once for each program.
+        gate_key = tuple((row, tuple(gates)) for row, gates in gate.items())
+        if gate_key not in self.transpiled_gates:
+            gate_dict = pad_gate_dict(gate, self.qudits)  # Each row is a qudit.
+            pulse_dict = gate_transpiler(gate_dict, self.tones)  # Rightnow it gives same number of columns as gate_dict.
+            self.transpiled_gates[gate_key] = (gate_dict, pulse_dict)
+        gate_dict, pulse_dict = self.transpiled_gates[gate_key]
+        n_columns = max((len(row) for row in gate_dict.values()), default=0)
 
-        default_lengths = [self.qubit_pulse_length_ns for _ in range(gate_df.shape[1])]
+        default_lengths = [self.qubit_pulse_length_ns for _ in range(n_columns)]
         lengths = self.make_it_list(lengths, default_lengths) 
-        assert len(lengths) == gate_df.shape[1], f'Scan: Please specify length for all gates(columns)!'
+        assert len(lengths) == n_columns, f'Scan: Please specify length for all gates(columns)!'
 
-        pulse_df = gate_transpiler(gate_df, self.tones)  # Rightnow it gives same number of columns as gate_df.
-        self.add_pulse(pulse_df, pulse_lengths=lengths, add_label=add_label, **pulse_kwargs)
+        self.add_pulse(pulse_dict, name, pulse_lengths=lengths, add_label=add_label, **pulse_kwargs)
         
-        # Concatenate a larger dataframe while keeping length for user to read/check it.
+        # Keep the tables so that self.gate_df and self.pulse_df can be built for user to read/check it.
         if concat_df: 
-            self.gate_df = pd.concat([self.gate_df, gate_df], axis=1)
-            self.pulse_df = pd.concat([self.pulse_df, pulse_df], axis=1)
+            self.gate_tables.append((name, gate_dict))
+            self.pulse_tables.append((name, pulse_dict))
             
             
-    def add_pulse(self, pulse_df: pd.DataFrame, pulse_lengths: list[int], add_label: bool = True, **pulse_kwargs):
+    def add_pulse(self, pulse_dict: dict[str: list[str]], name: str, pulse_lengths: list[int], 
+                  add_label: bool = True, **pulse_kwargs):
         """
-        Interpret the pulse dataframe to string and add it to the sequence program of each sequencer.
-        Here we assume user has specified length of each column.
+        Interpret the padded pulse dictionary to string and add it to the sequence program of each sequencer.
+        Here we assume user has specified length of each column, and column i will be labeled as 'name_i'.
+        Same pulse with same length on same tone will only be interpreted once for each program.
+        Most of them are padding 'I', which skip pulse_interpreter and come from idle_program directly.
+        Labels and kwargs are prepared once, then each tone emits all its columns in one tight loop.
         """
-        for i, col_name in enumerate(pulse_df):
-            column = pulse_df[col_name]
-            length = pulse_lengths[i]
-                
-            for tone in self.tones:
-                pulse_prog = '' if not add_label else f"""
-                # -----------{col_name}-----------
-        {col_name}:  """
+        labels = [('' if not add_label else f"""
+                # -----------{name}_{i}-----------
+        {name}_{i}:  """) for i in range(len(pulse_lengths))]
+        kwargs_key = tuple(sorted(pulse_kwargs.items()))
+
+        for tone in self.tones:
+            program_parts = self.sequences[tone]['program_parts']
+
+            for label, pulse_string, length in zip(labels, pulse_dict[tone], pulse_lengths):
+                if pulse_string == 'I':
+                    program_parts.append(label + idle_program(length))
+                    continue
+
+                key = (tone, pulse_string, length, kwargs_key)
+                if key not in self.pulse_programs:
+                    self.pulse_programs[key] = pulse_interpreter(cfg=self.cfg, tone=tone, pulse_string=pulse_string, 
+                                                                 length=length, **pulse_kwargs)
+                program_parts.append(label + self.pulse_programs[key])
         
-                pulse_prog += pulse_interpreter(cfg=self.cfg, tone=tone, pulse_string=column[tone], 
-                                                length=length, **pulse_kwargs)
-                self.sequences[tone]['program'] += pulse_prog
+        
+    def join_program(self, tone: str) -> str:
+        """
+        Join all fragments of sequence program of a tone into one string and return it.
+        The joined string will also become the only fragment in self.sequences[tone]['program_parts'].
+        It's useful when we need to edit the whole program, for example str.replace in RB.
+        """
+        program = ''.join(self.sequences[tone]['program_parts'])
+        self.sequences[tone]['program_parts'] = [program]
+        return program
         
         
     ##################################################    
@@ -646,19 +723,56 @@ class Scan:
         Create json file of sequence for each sequencer/qudit and save it.
         Allow user to pass a path of directory to save jsons at another place.
         A text file of sequence program will also be saved for reading.
+        The fragments in 'program_parts' are joined into 'program' only once here.
+        Files of different tones are written in parallel by threads since it's I/O bound.
         """
         if jsons_path is None:
             jsons_path = self.jsons_path 
 
-        for tone, sequence_dict in self.sequences.items():
-            tone_ = tone.replace('/', '_')
-            file_path = os.path.join(jsons_path, f'{tone_}_sequence.json')
-            with open(file_path, 'w', encoding='utf-8') as file:
-                json.dump(sequence_dict, file, indent=4)
-                
-            txt_file_path = os.path.join(jsons_path, f'{tone_}_sequence_program.txt')
-            with open(txt_file_path, 'w', encoding='utf-8') as txt:
-                txt.write(sequence_dict['program'])
+        for sequence_dict in self.sequences.values():
+            if 'program_parts' in sequence_dict: 
+                sequence_dict['program'] = ''.join(sequence_dict.pop('program_parts'))
+
+        with ThreadPoolExecutor(max_workers=max(1, min(8, len(self.sequences)))) as executor:
+            futures = [executor.submit(self.write_sequence_files, jsons_path, tone, sequence_dict)
+                       for tone, sequence_dict in self.sequences.items()]
+            for future in futures: future.result()  # Raise the exception from thread if there is.
+
+
+    @staticmethod
+    def write_sequence_files(jsons_path: str, tone: str, sequence_dict: dict):
+        """
+        Save the json of sequence and the text file of its program for one tone.
+        """
+        tone_ = tone.replace('/', '_')
+        file_path = os.path.join(jsons_path, f'{tone_}_sequence.json')
+        Scan.dump_sequence_json(sequence_dict, file_path)
+            
+        txt_file_path = os.path.join(jsons_path, f'{tone_}_sequence_program.txt')
+        with open(txt_file_path, 'w', encoding='utf-8') as txt:
+            txt.write(sequence_dict['program'])
+
+
+    @staticmethod
+    def dump_sequence_json(sequence_dict: dict, file_path: str):
+        """
+        Write a sequence dictionary into a compact json file.
+        Use orjson when it is installed and fall back to standard json for the types it refuses.
+        Human-readable program is saved separately as text, so we don't indent the json here.
+        Waveforms can be ndarray, and they only become list at here.
+        """
+        if orjson is not None:
+            try:
+                data = orjson.dumps(sequence_dict, option=orjson.OPT_SERIALIZE_NUMPY)
+            except TypeError:
+                pass
+            else:
+                with open(file_path, 'wb') as file:
+                    file.write(data)
+                return
+
+        with open(file_path, 'w', encoding='utf-8') as file:
+            json.dump(sequence_dict, file, default=np.ndarray.tolist)
 
 
     def upload_sequence(self):
@@ -696,24 +810,30 @@ class Scan:
         Create measurement dictionary, then start sequencer and save data into this dictionary.
         self.measurement should only have resonators' names as keys.
         Inside each resonator should be its subtones and consistent name of processing.
-        After all loops, the 'Heterodyned_readout' usually has shape (2, n_pyloops, n_seqloops*x_points).
+        The buffers are preallocated as ndarray and DACManager.start_sequencer_batch() writes each pyloop by index.
+        The 'Heterodyned_readout' has shape (2, n_pyloops, n_seqloops*x_points).
         We will reshape it to (2, n_reps, x_points) later by ProcessManager, where n_reps = n_seqloops * n_pyloops.
+        Buffers that won't be filled (no heralding, no raw) keep the shape (2, 0) as the old empty lists.
+        Raw scope traces are float32. They come from the ADC with far less than 24 bits of resolution, \
+        and 16384 samples per pyloop make them the largest arrays we keep.
         """
         self.measurement = {rr: {} for rr in self.readout_resonators}
+        heterodyned_shape = (2, self.n_pyloops, self.num_bins)
+        raw_shape = (2, self.n_pyloops, 16384)  # Qblox scope acquisition always has 16384 samples.
+        empty_shape = (2, 0)
 
         for rt in self.readout_tones:
             rr, subtone = rt.split('/')
-            self.measurement[rr][subtone] = {
-                'raw_readout': [[],[]],  # First element for I, second element for Q.
-                'raw_heralding': [[],[]],
-                'Heterodyned_readout': [[],[]],
-                'Heterodyned_heralding':[[],[]]
+            self.measurement[rr][subtone] = {  # First axis for I and Q.
+                'raw_readout': np.zeros(raw_shape if keep_raw else empty_shape, dtype=np.float32),
+                'raw_heralding': np.zeros(raw_shape if keep_raw and self.heralding_enable else empty_shape, 
+                                          dtype=np.float32),
+                'Heterodyned_readout': np.zeros(heterodyned_shape),
+                'Heterodyned_heralding': np.zeros(heterodyned_shape if self.heralding_enable else empty_shape)
             }
         
         print('Scan: Start sequencer.')
-        for i in range(self.n_pyloops):
-            self.cfg.DAC.start_sequencer(self.tones, self.measurement, keep_raw, self.heralding_enable)
-            print(f'Scan: Pyloop {i} finished!')
+        self.cfg.DAC.start_sequencer_batch(self.tones, self.measurement, self.n_pyloops, keep_raw, self.heralding_enable)
 
 
     def save_data(self):
@@ -815,6 +935,8 @@ class Scan:
         https://matplotlib.org/stable/api/_as_gen/matplotlib.axes.Axes.add_artist.html
         """
         self.figures = {}
+        # Raise resolution of fit result for smooth plot. Same x for all resonators.
+        x_fit = np.linspace(self.x_start, self.x_stop, self.x_points * 3)  
         
         for i, rr in enumerate(self.readout_resonators):
             level_index = self.level_to_fit[i] - self.cfg[f'variables.{rr}/lowest_readout_levels']      
@@ -830,10 +952,8 @@ class Scan:
             ax.set(xlabel=xlabel, ylabel=ylabel, title=title)
             
             if self.fit_result[rr] is not None: 
-                # Raise resolution of fit result for smooth plot.
-                x = np.linspace(self.x_start, self.x_stop, self.x_points * 3)  
-                y = self.fit_result[rr].eval(x=x)
-                ax.plot(x / self.x_unit_value, y, 'm-')
+                y = self.fit_result[rr].eval(x=x_fit)
+                ax.plot(x_fit / self.x_unit_value, y, 'm-')
                 
                 # AnchoredText stolen from Ray's code.
                 fit_text = '\n'.join([f'{v.name} = {v.value:0.5g}' for v in self.fit_result[rr].params.values()])
@@ -864,9 +984,8 @@ class Scan:
 
         for rt_ in self.readout_tones_:
             rr, subtone = rt_.split('_')
-            Is, Qs = self.measurement[rr][subtone][IQ_key]
-            left, right = (np.min(Is), np.max(Is))
-            bottom, top = (np.min(Qs), np.max(Qs))
+            Is, Qs = IQ_data = self.measurement[rr][subtone][IQ_key]
+            (left, right), (bottom, top) = get_IQ_limits(IQ_data)
 
             for x in range(self.x_points):
                 I = Is[:,x]
@@ -895,12 +1014,14 @@ class Scan:
         """
         Plot populations for all levels, both with and without readout correction.
         """           
+        x_plot_values = self.x_values / self.x_unit_value
+
         for rr in self.readout_resonators:
             fig, ax = plt.subplots(2, 1, figsize=(6, 8), dpi=dpi)
             for i, level in enumerate(self.cfg[f'variables.{rr}/readout_levels']):
-                ax[0].plot(self.x_values / self.x_unit_value, self.measurement[rr]['PopulationNormalized_readout'][i], 
+                ax[0].plot(x_plot_values, self.measurement[rr]['PopulationNormalized_readout'][i], 
                            c=f'C{level}', ls='-', marker='.', label=fr'$P_{{{level}}}$')
-                ax[1].plot(self.x_values / self.x_unit_value, self.measurement[rr]['PopulationCorrected_readout'][i], 
+                ax[1].plot(x_plot_values, self.measurement[rr]['PopulationCorrected_readout'][i], 
                            c=f'C{level}', ls='-', marker='.', label=fr'$P_{{{level}}}$')
 
             xlabel = f'{self.x_plot_label}[{self.x_plot_unit}]'
@@ -921,16 +1042,17 @@ class Scan:
         In this case we have all level population under both resonators' key.
         """
         only_corr = self.customized_data_process.endswith('corr')
+        x_plot_values = self.x_values / self.x_unit_value
 
         for r in self.readout_resonators:
             fig, ax = plt.subplots(2, 1, figsize=(6, 8), dpi=dpi)
 
             # Loop over all levels instead of the given readout_levels in cfg.
             for level, data in enumerate(self.measurement[r]['PopulationCorrected_readout']):
-                ax[1].plot(self.x_values / self.x_unit_value, data, 
+                ax[1].plot(x_plot_values, data, 
                            c=f'C{level}', ls='-', marker='.', label=fr'$P_{{{level}}}$')
                 if not only_corr:
-                    ax[0].plot(self.x_values / self.x_unit_value, 
+                    ax[0].plot(x_plot_values, 
                                self.measurement[r]['PopulationNormalized_readout'][level], 
                                c=f'C{level}', ls='-', marker='.', label=fr'$P_{{{level}}}$')
 
@@ -1023,9 +1145,7 @@ class Scan:
         """
         assert -500e6 <= freq <= 500e6, 'The frequency must between +-500MHz.'
         freq_4 = round(freq / freq_step)
-        
-        twos_complement_binary_str = format(freq_4 if freq_4 >= 0 else (1 << bit) + freq_4, f'0{bit}b')
-        return int(twos_complement_binary_str, 2)
+        return freq_4 & ((1 << bit) - 1)  # Two's complement without going through binary string.
     
 
     @staticmethod
@@ -1039,9 +1159,7 @@ class Scan:
         """
         assert -1 <= gain < 1, 'The gain must between [-1.0, 1.0).'
         gain = round(gain * gain_resolution)
-        
-        twos_complement_binary_str = format(gain if gain >= 0 else (1 << bit) + gain, f'0{bit}b')
-        return int(twos_complement_binary_str, 2)
+        return gain & ((1 << bit) - 1)
 
 
 
@@ -1111,8 +1229,8 @@ class Scan2D(Scan):
         assert self.num_bins <= 131072, \
             'x_points * y_points * n_seqloops cannot exceed 131072! Please use n_pyloops!'
          
-        self.y_values = np.linspace(self.y_start, self.y_stop, self.y_points)
-        self.y_step = (self.y_stop - self.y_start) / (self.y_points-1) if self.y_points != 1 else 0
+        self.y_values, y_step = np.linspace(self.y_start, self.y_stop, self.y_points, retstep=True)
+        self.y_step = float(y_step) if self.y_points != 1 else 0
         self.y_unit_value = getattr(u, self.y_plot_unit)
             
             
@@ -1133,16 +1251,17 @@ class Scan2D(Scan):
         Set necessary initial value of y parameter to the registers, especially R5 & R6. 
         Child class can super this method to add more initial values.
         """
-        for tone in self.tones: self.sequences[tone]['program'] += f"""            
+        yinit = f"""            
                     move             {self.y_points},R5    """
+        for tone in self.tones: self.sequences[tone]['program_parts'].append(yinit)
 
 
     def add_yloop(self):
         """
         Add y_loop to sequence program.
         """
-        for tone in self.tones: self.sequences[tone]['program'] += """            
-        ypt_loop:   """
+        for tone in self.tones: self.sequences[tone]['program_parts'].append("""            
+        ypt_loop:   """)
 
 
     def end_loop(self):
@@ -1171,7 +1290,7 @@ class Scan2D(Scan):
         """
         y_end = """
                     loop             R5,@ypt_loop    """
-        for tone in self.tones: self.sequences[tone]['program'] += y_end
+        for tone in self.tones: self.sequences[tone]['program_parts'].append(y_end)
 
 
     def process_data(self):
@@ -1207,10 +1326,15 @@ class Scan2D(Scan):
         If we disable classification, plot both quadrature.
         """
         self.figures = {}
+        extent = [np.min(self.x_values) / self.x_unit_value, 
+                  np.max(self.x_values) / self.x_unit_value, 
+                  np.min(self.y_values) / self.y_unit_value, 
+                  np.max(self.y_values) / self.y_unit_value]
 
         for rr in self.readout_resonators:
             data = self.measurement[rr]['to_fit']
             n_subplots = len(data)
+            readout_levels = self.cfg[f'variables.{rr}/readout_levels']
             xlabel = self.x_plot_label + f'[{self.x_plot_unit}]'
             ylabel = self.y_plot_label + f'[{self.y_plot_unit}]'
             title = f'{self.datetime_stamp}, {self.scan_name}, {rr}'
@@ -1218,14 +1342,11 @@ class Scan2D(Scan):
             fig, ax = plt.subplots(1, n_subplots, figsize=(7 * n_subplots, 8), dpi=dpi)
 
             for l in range(n_subplots):
-                level = self.cfg[f'variables.{rr}/readout_levels'][l]
+                level = readout_levels[l]
                 this_title = title + fr', $P_{{{level}}}$' if self.classification_enable else title
                 
                 image = ax[l].imshow(data[l], cmap='RdBu_r', interpolation='none', aspect='auto', 
-                                     origin='lower', extent=[np.min(self.x_values) / self.x_unit_value, 
-                                                             np.max(self.x_values) / self.x_unit_value, 
-                                                             np.min(self.y_values) / self.y_unit_value, 
-                                                             np.max(self.y_values) / self.y_unit_value])
+                                     origin='lower', extent=extent)
                 ax[l].set(title=this_title, xlabel=xlabel, ylabel=ylabel)
                 fig.colorbar(image, ax=ax[l], label='Probability/Coordinate', location='top')
                 
@@ -1248,9 +1369,8 @@ class Scan2D(Scan):
 
         for rt_ in self.readout_tones_:
             rr, subtone = rt_.split('_')
-            Is, Qs = self.measurement[rr][subtone][IQ_key]
-            left, right = (np.min(Is), np.max(Is))
-            bottom, top = (np.min(Qs), np.max(Qs))
+            Is, Qs = IQ_data = self.measurement[rr][subtone][IQ_key]
+            (left, right), (bottom, top) = get_IQ_limits(IQ_data)
 
             for y in range(self.y_points):
                 for x in range(self.x_points):
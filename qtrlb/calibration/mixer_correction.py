@@ -76,7 +76,7 @@ class MixerCorrection:
                         """
                     }
 
-        self.cfg.DAC.qblox.reset()
+        self.cfg.DAC.reset()
         self.cfg.DAC.disconnect_existed_map()
         self.cfg.DAC.disable_all_lo()
         self.sequencer.sequence(sequence)
@@ -2,6 +2,7 @@ import os
 import traceback
 import numpy as np
 import matplotlib.pyplot as plt
+from concurrent.futures import ThreadPoolExecutor
 from lmfit import Model
 from matplotlib.offsetbox import AnchoredText
 import qtrlb.utils.units as u
@@ -9,10 +10,11 @@ from qtrlb.config.config import MetaManager
 from qtrlb.utils.waveforms import get_waveform
 from qtrlb.calibration.calibration import Scan2D
 from qtrlb.calibration.scan_classes import RabiScan, LevelScan, Spectroscopy
-from qtrlb.processing.plotting import plot_IQ
+from qtrlb.processing.plotting import plot_IQ, get_IQ_limits
 from qtrlb.processing.fitting import fit, QuadModel, SpectroscopyModel, ResonatorHangerTransmissionModel
+from qtrlb.processing.kernels import get_threading_layer
 from qtrlb.processing.processing import rotate_IQ, gmm_fit, gmm_predict, normalize_population, \
-                                        get_readout_fidelity, sort_points_by_distance
+                                        sort_points_by_distance, single_gaussian_fit
 
 
 
@@ -75,7 +77,7 @@ class ChevronScan(Scan2D, RabiScan):
             yinit = f"""
                     move             {ssb_freq_start_4},R6
             """
-            self.sequences[tone]['program'] += yinit
+            self.sequences[tone]['program_parts'].append(yinit)
 
 
     def add_main(self):
@@ -90,9 +92,9 @@ class ChevronScan(Scan2D, RabiScan):
 
     def add_yvalue(self):
         ssb_freq_step_4 = self.frequency_translator(self.y_step)
-        for tone in self.main_tones:  self.sequences[tone]['program'] += f"""
+        for tone in self.main_tones:  self.sequences[tone]['program_parts'].append(f"""
                     add              R6,{ssb_freq_step_4},R6
-        """
+        """)
             
 
     def fit_data(self, x=None, **fitting_kwargs):
@@ -149,15 +151,15 @@ class AmplitudeDetuningScan(Scan2D, Spectroscopy):
         Here R6 is the gain on main path and R11 is the gain of the DRAG path.
         """
         super().add_yinit()
+        start = self.gain_translator(self.y_start)
         
         for tone in self.main_tones:
-            start = self.gain_translator(self.y_start)
             start_drag = self.gain_translator(self.y_start * self.cfg[f'variables.{tone}/DRAG_weight'])
             yinit = f"""
                     move             {start},R6     
                     move             {start_drag},R11
             """
-            self.sequences[tone]['program'] += yinit
+            self.sequences[tone]['program_parts'].append(yinit)
 
 
     def add_main(self):
@@ -165,14 +167,15 @@ class AmplitudeDetuningScan(Scan2D, Spectroscopy):
 
 
     def add_yvalue(self):
+        step = self.gain_translator(self.y_step)
+
         for tone in self.main_tones:            
-            step = self.gain_translator(self.y_step)
             step_drag = self.gain_translator(self.y_step * self.cfg[f'variables.{tone}/DRAG_weight'])
                     
-            self.sequences[tone]['program'] += f""" 
+            self.sequences[tone]['program_parts'].append(f""" 
                     add              R6,{step},R6
                     add              R11,{step_drag},R11
-            """
+            """)
         
 
 class ACStarkSpectroscopy(Scan2D, Spectroscopy):
@@ -250,15 +253,17 @@ class ACStarkSpectroscopy(Scan2D, Spectroscopy):
         Here R6 is the amplitude of stimulation pulse.
         """
         super().add_yinit()
+        y_start = self.gain_translator(self.y_start)
         
         for tone in self.tones:
-            y_start = self.gain_translator(self.y_start)
-            self.sequences[tone]['program'] += f"""
+            self.sequences[tone]['program_parts'].append(f"""
                     move             {y_start},R6
-            """
+            """)
 
 
     def add_main(self):
+        step = self.frequency_translator(self.x_step)
+
         for tone in self.tones:
 
             if tone in self.readout_tones:
@@ -273,7 +278,6 @@ class ACStarkSpectroscopy(Scan2D, Spectroscopy):
                 """
 
             elif tone in self.main_tones:
-                step = self.frequency_translator(self.x_step)
                 gain = round(self.cfg.variables[f'{tone}']['amp_180'] * 32768)
                 gain_drag = round(gain * self.cfg.variables[f'{tone}']['DRAG_weight'])
                 main = f"""
@@ -291,14 +295,14 @@ class ACStarkSpectroscopy(Scan2D, Spectroscopy):
                     wait             {self.stimulation_pulse_length_ns + self.ringdown_time_ns}
                 """
 
-            self.sequences[tone]['program'] += main
+            self.sequences[tone]['program_parts'].append(main)
 
 
     def add_yvalue(self):
         y_step = self.gain_translator(self.y_step)
-        for tone in self.tones:  self.sequences[tone]['program'] += f"""
+        for tone in self.tones:  self.sequences[tone]['program_parts'].append(f"""
                     add              R6,{y_step},R6
-        """
+        """)
 
 
     def fit_data(self, x: list | np.ndarray = None, **fitting_kwargs):
@@ -335,6 +339,11 @@ class ACStarkSpectroscopy(Scan2D, Spectroscopy):
         Here we will save all the plot without showing in console or make them attributes.
         See Scan.plot_main() as reference.
         """
+        x_plot_values = self.x_values / self.x_unit_value
+        # Raise resolution of fit result for smooth plot. Same for all resonators and amplitudes.
+        x_fit = np.linspace(self.x_start, self.x_stop, self.x_points * 3)
+        x_fit_plot_values = x_fit / self.x_unit_value
+
         for i, rr in enumerate(self.readout_resonators):
             level_index = self.level_to_fit[i] - self.cfg[f'variables.{rr}/lowest_readout_levels']      
 
@@ -345,15 +354,13 @@ class ACStarkSpectroscopy(Scan2D, Spectroscopy):
 
             for j, amp in enumerate(self.y_values):
                 fig, ax = plt.subplots(1, 1, dpi=dpi)
-                ax.plot(self.x_values / self.x_unit_value, self.measurement[rr]['to_fit'][level_index][j], 'k.')
+                ax.plot(x_plot_values, self.measurement[rr]['to_fit'][level_index][j], 'k.')
                 ax.set(xlabel=self.x_plot_label + f'[{self.x_plot_unit}]', ylabel=ylabel, 
                        title=f'{self.datetime_stamp}, {self.scan_name}, {rr}, Amp{amp}')
 
                 if self.measurement[rr][f'fit_result_{j}'] is not None: 
-                    # Raise resolution of fit result for smooth plot.
-                    x = np.linspace(self.x_start, self.x_stop, self.x_points * 3)  
-                    y = self.fit_result[rr][j].eval(x=x)
-                    ax.plot(x / self.x_unit_value, y, 'm-')
+                    y = self.fit_result[rr][j].eval(x=x_fit)
+                    ax.plot(x_fit_plot_values, y, 'm-')
                     
                     fit_text = '\n'.join([f'{v.name} = {v.value:0.3g}' for v in self.fit_result[rr][j].params.values()])
                     ax.add_artist(AnchoredText(fit_text, loc=text_loc, prop={'color':'m'}))
@@ -367,13 +374,15 @@ class ACStarkSpectroscopy(Scan2D, Spectroscopy):
         Here we will save all the plot without showing in console or make them attributes.
         See Scan.plot_population() as reference.
         """
+        x_plot_values = self.x_values / self.x_unit_value
+
         for rr in self.readout_resonators:
             for j, amp in enumerate(self.y_values):
                 fig, ax = plt.subplots(2, 1, figsize=(6, 8), dpi=dpi)
                 for i, level in enumerate(self.cfg[f'variables.{rr}/readout_levels']):
-                    ax[0].plot(self.x_values / self.x_unit_value, self.measurement[rr]['PopulationNormalized_readout'][i][j], 
+                    ax[0].plot(x_plot_values, self.measurement[rr]['PopulationNormalized_readout'][i][j], 
                                c=f'C{level}', ls='-', marker='.', label=fr'$P_{{{level}}}$')
-                    ax[1].plot(self.x_values / self.x_unit_value, self.measurement[rr]['PopulationCorrected_readout'][i][j], 
+                    ax[1].plot(x_plot_values, self.measurement[rr]['PopulationCorrected_readout'][i][j], 
                                c=f'C{level}', ls='-', marker='.', label=fr'$P_{{{level}}}$')
 
                 xlabel = f'{self.x_plot_label}[{self.x_plot_unit}]'
@@ -401,10 +410,13 @@ class ReadoutTemplateScan(Scan2D, LevelScan):
         and we have to rebuild some wheels. Although it's possible to leave an interface in some \
         parent method, that will make things too thick, too ugly and hard to read.
     """
-    def process_data(self, compensate_ED: bool = False):
+    def process_data(self, compensate_ED: bool = False, n_jobs: int = 1):
         """
         Here we override the parent method since the processing for this Scan has no similarity to \
         other Scan. Code is similar to CalibrateClassification.fit_data().
+        Set n_jobs > 1 to process resonators in parallel threads.
+        It needs a thread-safe Numba threading layer (tbb or omp) if Numba is installed, \
+        otherwise the resonators are processed one by one.
 
         Note from Zihao(12/18/2023):
         At the current measurement, keys like 'R4/a' will typically only have 'IQrotated_readout' inside, \
@@ -415,68 +427,94 @@ class ReadoutTemplateScan(Scan2D, LevelScan):
 
         shape = (2, self.n_reps, self.y_points, self.x_points)
         electrical_delay = self.cfg['variables.common/electrical_delay'] if compensate_ED else 0
-        phase_offset = np.exp(1j * 2 * np.pi * self.y_values * electrical_delay)
-
-        # Loop over each resonator
-        for rr, data_dict in self.measurement.items():
-            # Loop over its subtones and collect all IQ.  
-            multitone_IQ_readout = []
-            for subtone, subtone_dict in data_dict.items():
-                # Check whether k is name of subtones. Otherwise if k is process name, we skip it.
-                if not (isinstance(subtone_dict, dict) and 'Heterodyned_readout' in subtone_dict): continue
-
-                angle = self.cfg[f'process.{rr}/{subtone}/IQ_rotation_angle']
-                subtone_dict['Reshaped_readout'] = np.array(subtone_dict['Heterodyned_readout']).reshape(shape)
-                subtone_dict['IQrotated_readout'] = rotate_IQ(subtone_dict['Reshaped_readout'], angle)
-                multitone_IQ_readout.append(subtone_dict['IQrotated_readout'])
-
-            multitone_IQ_readout = np.concatenate(multitone_IQ_readout, axis=0)
+        phase_offset = np.exp((2j * np.pi * electrical_delay) * self.y_values)
+
+        # Resonators are independent. Threads are enough since NumPy and Numba release the GIL.
+        # Numba workqueue layer kills the interpreter when its kernels are called from several threads.
+        if n_jobs > 1 and get_threading_layer() == 'workqueue':
+            print('RTS: Numba workqueue threading layer is not thread-safe. Process resonators sequentially. '
+                  'Install tbb or OpenMP to use n_jobs > 1.')
+            n_jobs = 1
+
+        if n_jobs > 1 and len(self.measurement) > 1:
+            with ThreadPoolExecutor(max_workers=min(n_jobs, len(self.measurement))) as executor:
+                futures = [executor.submit(self.process_resonator, rr, data_dict, shape, phase_offset)
+                           for rr, data_dict in self.measurement.items()]
+                for future in futures: future.result()
+        else:
+            for rr, data_dict in self.measurement.items():
+                self.process_resonator(rr, data_dict, shape, phase_offset)
+
+
+    def process_resonator(self, rr: str, data_dict: dict, shape: tuple, phase_offset: np.ndarray):
+        """
+        Process data of a single resonator in place. It's the loop body of process_data().
+        It only writes into data_dict, so different resonators can run in different threads.
+        """
+        # Loop over its subtones and collect all IQ.  
+        multitone_IQ_readout = []
+        for subtone, subtone_dict in data_dict.items():
+            # Check whether k is name of subtones. Otherwise if k is process name, we skip it.
+            if not (isinstance(subtone_dict, dict) and 'Heterodyned_readout' in subtone_dict): continue
+
+            angle = self.cfg[f'process.{rr}/{subtone}/IQ_rotation_angle']
+            subtone_dict['Reshaped_readout'] = np.asarray(subtone_dict['Heterodyned_readout']).reshape(shape)
+            subtone_dict['IQrotated_readout'] = rotate_IQ(subtone_dict['Reshaped_readout'], angle)
+            multitone_IQ_readout.append(subtone_dict['IQrotated_readout'])
+
+        multitone_IQ_readout = np.concatenate(multitone_IQ_readout, axis=0)
+    
+        # Average over repetitions first, so the complex array is only formed on the (y_points, x_points) grid.
+        data_dict['IQaveraged_readout'] = np.mean(multitone_IQ_readout, axis=1)
+        data_dict['IQcomplex_readout'] = (data_dict['IQaveraged_readout'][0]
+                                         + 1j * data_dict['IQaveraged_readout'][1])
+        data_dict['IQEDcompensated_readout'] = data_dict['IQcomplex_readout'] * phase_offset[:, None]
         
-            data_dict['IQaveraged_readout'] = np.mean(multitone_IQ_readout, axis=1)
-            data_dict['IQcomplex_readout'] = (data_dict['IQaveraged_readout'][0]
-                                             + 1j * data_dict['IQaveraged_readout'][1])
-            data_dict['IQEDcompensated_readout'] = (data_dict['IQcomplex_readout'].T * phase_offset).T
-            
-            # Then loop all y_values and use GMM model to fit them and get confusion matrix.
-            data_dict['GMMfitted'] = {}
-            data_dict['to_fit'] = []
-            
-            for y in range(self.y_points):
-                sub_dict = {}
-                means = np.zeros((self.x_points, 2))
-                covariances = np.zeros((self.x_points, 2))
-                
-                for x in range(self.x_points):
-                    data = multitone_IQ_readout[..., y, x]
-                    gmm = gmm_fit(data, n_components=1)
-                    means[x] = gmm.means_[0]
-                    covariances[x] = gmm.covariances_[0]
-                    # Because the default form is one more layer nested.
-
-                # Refit with multi-component model.
-                # It's better for poor state preparation or decay during readout.
-                if hasattr(self, 'refine_mixture_fitting') and self.refine_mixture_fitting is True:
-                    gmm = gmm_fit(data, n_components=self.x_points, 
-                                  refine=True, means=means, covariances=covariances)
-                    means_new, covariances_new = gmm.means_, gmm.covariances_
-                    indices = sort_points_by_distance(means_new, means)
-                    means = means_new[indices]
-                    covariances = covariances_new[indices]
-                    
-                sub_dict['means'] = means
-                sub_dict['covariances'] = covariances
-                sub_dict['GMMpredicted'] = gmm_predict(multitone_IQ_readout[..., y, :], 
-                                                       means=means, covariances=covariances,
-                                                       lowest_level=self.x_start)
-                sub_dict['confusionmatrix'] = normalize_population(sub_dict['GMMpredicted'], 
-                                                                   levels=self.x_values)
-                sub_dict['ReadoutFidelity'] = get_readout_fidelity(sub_dict['confusionmatrix'])
-                
-                data_dict['GMMfitted'][f'{y}'] = sub_dict
-                data_dict['to_fit'].append(sub_dict['ReadoutFidelity'])
+        # Fit all (y, x) points with single Gaussian at once. They have shape (y_points, x_points, n_features).
+        # Then loop all y_values and use GMM model to get confusion matrix.
+        all_means, all_covariances = single_gaussian_fit(multitone_IQ_readout)
+        # Keys are string of y index since h5py group names must be string.
+        data_dict['GMMfitted'] = {}
+
+        # Move y to the front once, so each per-y slice below is contiguous and still has IQ axis first.
+        IQ_by_y = np.ascontiguousarray(np.moveaxis(multitone_IQ_readout, -2, 0))
+        
+        for y in range(self.y_points):
+            sub_dict = {}
+            means = all_means[y]
+            covariances = all_covariances[y]
+
+            # Refit with multi-component model.
+            # It's better for poor state preparation or decay during readout.
+            if hasattr(self, 'refine_mixture_fitting') and self.refine_mixture_fitting is True:
+                data = IQ_by_y[y, ..., -1]  # Same data as the previous per-x loop left behind.
+                gmm = gmm_fit(data, n_components=self.x_points, 
+                              refine=True, means=means, covariances=covariances)
+                means_new, covariances_new = gmm.means_, gmm.covariances_
+                indices = sort_points_by_distance(means_new, means)
+                means = means_new[indices]
+                covariances = covariances_new[indices]
                 
-            data_dict['to_fit'] = np.array([data_dict['to_fit']])
-            # Do not delete this nested structure.
+            sub_dict['means'] = means
+            sub_dict['covariances'] = covariances
+            sub_dict['GMMpredicted'] = gmm_predict(IQ_by_y[y], 
+                                                   means=means, covariances=covariances,
+                                                   lowest_level=self.x_start)
+            data_dict['GMMfitted'][f'{y}'] = sub_dict
+
+        # Count population of all y at once. It has shape (n_levels, y_points, x_points).
+        # The confusion matrix of each y is a slice of it, and fidelity is the mean of its diagonal.
+        sub_dicts = list(data_dict['GMMfitted'].values())
+        GMMpredicted = np.stack([sub_dict['GMMpredicted'] for sub_dict in sub_dicts], axis=1)
+        confusionmatrices = normalize_population(GMMpredicted, levels=self.x_values)
+        fidelities = np.mean(np.diagonal(confusionmatrices, axis1=0, axis2=2), axis=-1)
+
+        for y, sub_dict in enumerate(sub_dicts):
+            sub_dict['confusionmatrix'] = confusionmatrices[:, y, :]
+            sub_dict['ReadoutFidelity'] = float(fidelities[y])
+            
+        data_dict['to_fit'] = fidelities[np.newaxis, :]
+        # Do not delete this nested structure.
             
             
     def fit_data(self):
@@ -500,21 +538,23 @@ class ReadoutTemplateScan(Scan2D, LevelScan):
         Code is similar to Scan.plot_main()
         """
         self.figures = {}
+        y_plot_values = self.y_values / self.y_unit_value
+        xlabel = self.y_plot_label + f'[{self.y_plot_unit}]'
+        # Raise resolution of fit result for smooth plot. Same for all resonators.
+        x_fit = np.linspace(self.y_start, self.y_stop, self.y_points * 3)
+        x_fit_plot_values = x_fit / self.y_unit_value
+        ylabel = 'Readout Fidelity [a.u.]'
 
         for rr in self.readout_resonators:
             title = f'{self.datetime_stamp}, {self.scan_name}, {rr}'
-            xlabel = self.y_plot_label + f'[{self.y_plot_unit}]'
-            ylabel = 'Readout Fidelity [a.u.]'
             
             fig, ax = plt.subplots(1, 1, dpi=150)
-            ax.plot(self.y_values / self.y_unit_value, self.measurement[rr]['to_fit'][0], 'k.')
+            ax.plot(y_plot_values, self.measurement[rr]['to_fit'][0], 'k.')
             ax.set(xlabel=xlabel, ylabel=ylabel, title=title)
             
             if self.fit_result[rr] is not None: 
-                # Raise resolution of fit result for smooth plot.
-                x = np.linspace(self.y_start, self.y_stop, self.y_points * 3)  
-                y = self.fit_result[rr].eval(x=x)
-                ax.plot(x / self.y_unit_value, y, 'm-')
+                y = self.fit_result[rr].eval(x=x_fit)
+                ax.plot(x_fit_plot_values, y, 'm-')
                 
                 # AnchoredText stolen from Ray's code.
                 fit_text = '\n'.join([f'{v.name} = {v.value:0.5g}' for v in self.fit_result[rr].params.values()])
@@ -531,8 +571,11 @@ class ReadoutTemplateScan(Scan2D, LevelScan):
         For readout amplitude and length, it may not be approprite to call it spectrum.
         But, you get what I mean here :)
         """
+        y_plot_values = self.y_values / self.y_unit_value
+
         for rr in self.readout_resonators:
             data = self.measurement[rr]['IQEDcompensated_readout']
+            phases, amplitudes = np.angle(data), np.absolute(data)
             
             title = f'{self.datetime_stamp}, {self.scan_name}, {rr}'
             xlabel = self.y_plot_label + f'[{self.y_plot_unit}]'
@@ -544,9 +587,9 @@ class ReadoutTemplateScan(Scan2D, LevelScan):
             
             # The level might not always start from 0.
             for i, level in enumerate(self.x_values):
-                ax[0].plot(self.y_values / self.y_unit_value, np.angle(data[:, i]), 
+                ax[0].plot(y_plot_values, phases[:, i], 
                            c=self.color_list[level], label=f'|{level}>')
-                ax[1].plot(self.y_values / self.y_unit_value, np.absolute(data[:, i]), 
+                ax[1].plot(y_plot_values, amplitudes[:, i], 
                            c=self.color_list[level], label=f'|{level}>')
 
             ax[0].legend()
@@ -554,32 +597,42 @@ class ReadoutTemplateScan(Scan2D, LevelScan):
             fig.savefig(os.path.join(self.data_path, f'{rr}_spectrum.png'))
             
             
-    def plot_IQ(self):
+    def plot_IQ(self, dpi: int = 100, max_points: int = 2000):
         """
         Plot IQ data for all y_values, each y_value will have a plot with all levels.
         Code is similar to Scan.plot_IQ()
+        There can be hundreds of these PNG, so we use low zlib compression level to make saving faster.
+        Only every n-th repetition is plotted so that each subplot has at most about max_points points.
+        With alpha=0.2 the blobs look the same, and scatter time scales with number of points.
+        Set max_points to None to plot all repetitions.
         """
         if self.cfg['variables.common/plot_IQ'] is False: return
+        step = 1 if max_points is None else max(1, self.n_reps // max_points)
 
         for rt_ in self.readout_tones_:
             rr, subtone = rt_.split('_')
-            Is, Qs = self.measurement[rr][subtone]['IQrotated_readout']
-            left, right = (np.min(Is), np.max(Is))
-            bottom, top = (np.min(Qs), np.max(Qs))
+            IQrotated_readout = self.measurement[rr][subtone]['IQrotated_readout']
+            GMMfitted = self.measurement[rr]['GMMfitted']
+            (left, right), (bottom, top) = get_IQ_limits(IQrotated_readout)
+            
+            # Reuse one figure for all y_values since creating figure is much slower than clearing axes.
+            fig, ax = plt.subplots(1, self.x_points, figsize=(6 * self.x_points, 6), dpi=dpi)
             
             for y in range(self.y_points):                
-                fig, ax = plt.subplots(1, self.x_points, figsize=(6 * self.x_points, 6), dpi=150)
+                GMMpredicted = GMMfitted[f'{y}']['GMMpredicted']
                 
                 for x in range(self.x_points):
-                    I = self.measurement[rr][subtone]['IQrotated_readout'][0,:,y,x]
-                    Q = self.measurement[rr][subtone]['IQrotated_readout'][1,:,y,x]
-                    c = self.measurement[rr]['GMMfitted'][f'{y}']['GMMpredicted'][:,x]
+                    I = IQrotated_readout[0,::step,y,x]
+                    Q = IQrotated_readout[1,::step,y,x]
+                    c = GMMpredicted[::step,x]
+                    ax[x].cla()
                     ax[x] = plot_IQ(ax[x], I, Q, c, title=fr'${{\left|{self.x_values[x]}\right\rangle}}$', 
                                     xlim=(left, right), ylim=(bottom, top))
                     
-                fig.savefig(os.path.join(self.data_path, 'IQplots', rt_, f'{y}.png'))
-                fig.clear()
-                plt.close(fig)        
+                fig.savefig(os.path.join(self.data_path, 'IQplots', rt_, f'{y}.png'), pil_kwargs={'compress_level': 1})
+
+            fig.clear()
+            plt.close(fig)        
         
         
 class ReadoutFrequencyScan(ReadoutTemplateScan):
@@ -632,7 +685,7 @@ class ReadoutFrequencyScan(ReadoutTemplateScan):
             yinit = f"""
                     move             {ssb_freq_start_4},R6
             """
-            self.sequences[rt]['program'] += yinit
+            self.sequences[rt]['program_parts'].append(yinit)
         
         
     def add_readout(self):
@@ -660,13 +713,13 @@ class ReadoutFrequencyScan(ReadoutTemplateScan):
                     acquire          0,R1,{length - tof_ns}
                 """
 
-            self.sequences[tone]['program'] += readout
+            self.sequences[tone]['program_parts'].append(readout)
         
         
     def add_yvalue(self):
         ssb_freq_step_4 = self.frequency_translator(self.y_step)
-        for rt in self.readout_tones:  self.sequences[rt]['program'] += f"""
-                    add              R6,{ssb_freq_step_4},R6    """
+        for rt in self.readout_tones:  self.sequences[rt]['program_parts'].append(f"""
+                    add              R6,{ssb_freq_step_4},R6    """)
 
 
     def process_data(self):
@@ -706,10 +759,11 @@ class ReadoutFrequencyScan(ReadoutTemplateScan):
             fig, ax = plt.subplots(2, 1, figsize=(8, 8), dpi=150)
             ax[0].set(xlabel=xlabel, ylabel=ylabel[0], title=title)
             ax[1].set(xlabel=xlabel, ylabel=ylabel[1])
-            ax[0].plot(self.y_values / self.y_unit_value, np.angle(data_to_fit), 'k.', label=f'|{level}>')
-            ax[0].plot(self.y_values / self.y_unit_value, np.angle(data_reeval), 'm-', label=f'|{level}>, Fit')
-            ax[1].plot(self.y_values / self.y_unit_value, np.abs(data_to_fit), 'k.', label=f'|{level}>')
-            ax[1].plot(self.y_values / self.y_unit_value, np.abs(data_reeval), 'm-', label=f'|{level}>, Fit')
+            y_plot_values = self.y_values / self.y_unit_value
+            ax[0].plot(y_plot_values, np.angle(data_to_fit), 'k.', label=f'|{level}>')
+            ax[0].plot(y_plot_values, np.angle(data_reeval), 'm-', label=f'|{level}>, Fit')
+            ax[1].plot(y_plot_values, np.abs(data_to_fit), 'k.', label=f'|{level}>')
+            ax[1].plot(y_plot_values, np.abs(data_reeval), 'm-', label=f'|{level}>, Fit')
 
             # Add label/legend to figure.
             fit_text = '\n'.join([f'{v.name} = {v.value:0.2g}' 
@@ -783,7 +837,7 @@ class ReadoutAmplitudeScan(ReadoutTemplateScan):
             yinit = f"""
                     move             {gain},R6
             """
-            self.sequences[rt]['program'] += yinit
+            self.sequences[rt]['program_parts'].append(yinit)
         
         
     def add_readout(self):
@@ -811,13 +865,13 @@ class ReadoutAmplitudeScan(ReadoutTemplateScan):
                     acquire          0,R1,{length - tof_ns}
                 """
 
-            self.sequences[tone]['program'] += readout
+            self.sequences[tone]['program_parts'].append(readout)
         
         
     def add_yvalue(self):
         gain_step = round(self.y_step * 32768)
-        for rt in self.readout_tones:  self.sequences[rt]['program'] += f"""
-                    add              R6,{gain_step},R6    """
+        for rt in self.readout_tones:  self.sequences[rt]['program_parts'].append(f"""
+                    add              R6,{gain_step},R6    """)
 
 
 class ReadoutLengthAmpScan(ReadoutAmplitudeScan):
@@ -915,6 +969,9 @@ class ReadoutLengthAmpScan(ReadoutAmplitudeScan):
             for rt_ in self.readout_tones_: os.makedirs(os.path.join(self.data_path, 'IQplots', rt_))
 
             # Run as usual, but using the new self.data_path.
+            # The sequence is rebuilt for each length on purpose, not just the acquire/wait operands.
+            # Length also changes RO waveform, acquisition weights and how add_wait splits the waits.
+            # Gate waveforms don't depend on length, and get_waveform_cached already reuses them.
             self.make_sequence() 
             self.save_sequence()
             self.save_sequence(jsons_path=os.path.join(self.data_path, 'Jsons'))
@@ -1035,7 +1092,7 @@ class DRAGWeightScan(Scan2D):
                     move             {gain_drag_half_start},R12
                     move             {gain_half},R13
             """
-            self.sequences[tone]['program'] += yinit
+            self.sequences[tone]['program_parts'].append(yinit)
 
 
     def add_main(self):
@@ -1045,6 +1102,13 @@ class DRAGWeightScan(Scan2D):
         https://qblox-qblox-instruments.readthedocs-hosted.com/en/master/documentation/sequencer.html
         To implement error amplification method, we will make R14 = - R11, R15 = - R6, R16 = 0.
         """
+        # The error amplification block doesn't depend on tone, so we build it once for both branches of all tones.
+        error_amplification = f"""
+                    set_awg_gain     R14,R15
+                    play             0,1,{self.qubit_pulse_length_ns}
+                    set_awg_gain     R11,R6
+                    play             0,1,{self.qubit_pulse_length_ns}
+            """ * self.error_amplification_factor
 
         for tone in self.main_tones:
             ssb_freq = self.cfg[f'variables.{tone}/mod_freq'] + self.cfg[f'variables.{tone}/pulse_detuning']
@@ -1068,12 +1132,7 @@ class DRAGWeightScan(Scan2D):
                     play             0,1,{self.qubit_pulse_length_ns}
             """
 
-                  + f"""
-                    set_awg_gain     R14,R15
-                    play             0,1,{self.qubit_pulse_length_ns}
-                    set_awg_gain     R11,R6
-                    play             0,1,{self.qubit_pulse_length_ns}
-            """ * self.error_amplification_factor
+                  + error_amplification
                     
                   + f""" 
                     set_ph_delta     {angle_90n}
@@ -1090,12 +1149,7 @@ class DRAGWeightScan(Scan2D):
                     play             0,1,{self.qubit_pulse_length_ns}
             """
 
-                  + f"""
-                    set_awg_gain     R14,R15
-                    play             0,1,{self.qubit_pulse_length_ns}
-                    set_awg_gain     R11,R6
-                    play             0,1,{self.qubit_pulse_length_ns}
-            """ * self.error_amplification_factor
+                  + error_amplification
                     
                   + f"""
                     set_ph_delta     {angle_90}
@@ -1106,26 +1160,27 @@ class DRAGWeightScan(Scan2D):
 
         end_main:
             """)
-            self.sequences[tone]['program'] += main
+            self.sequences[tone]['program_parts'].append(main)
 
-        for tone in self.rest_tones:
-            main = f"""
+        main = f"""
                     wait             {self.qubit_pulse_length_ns * 2}
             """
-            self.sequences[tone]['program'] += main
+        for tone in self.rest_tones:
+            self.sequences[tone]['program_parts'].append(main)
 
 
     def add_yvalue(self):
+        # Only a few main tones here, so per-tone translator call is cheaper than building arrays.
         for tone in self.main_tones:
-            gain_raw = self.cfg[f'variables.{tone}/amp_180']
+            gain_step = self.cfg[f'variables.{tone}/amp_180'] * self.y_step
             
-            gain_drag_step = self.gain_translator(gain_raw * self.y_step)
-            gain_drag_step_half = self.gain_translator(gain_raw * self.y_step / 2)
+            gain_drag_step = self.gain_translator(gain_step)
+            gain_drag_step_half = self.gain_translator(gain_step / 2)
 
-            self.sequences[tone]['program'] += f"""
+            self.sequences[tone]['program_parts'].append(f"""
                     add              R6,{gain_drag_step},R6
                     add              R12,{gain_drag_step_half},R12
-            """
+            """)
 
 
     def process_data(self):
@@ -1135,8 +1190,10 @@ class DRAGWeightScan(Scan2D):
         """
         super().process_data()
         for data_dict in self.measurement.values(): 
-            data_dict['to_fit_raw'] = data_dict['to_fit']
-            data_dict['to_fit'] = (data_dict['to_fit_raw'][..., 0] - data_dict['to_fit_raw'][..., 1]) ** 2
+            to_fit_raw = data_dict['to_fit_raw'] = data_dict['to_fit']
+            # Square in place on the difference, so there is only one temporary array.
+            to_fit = np.subtract(to_fit_raw[..., 0], to_fit_raw[..., 1])
+            data_dict['to_fit'] = np.square(to_fit, out=to_fit)
 
 
     def fit_data(self):
@@ -1149,25 +1206,27 @@ class DRAGWeightScan(Scan2D):
         Code is similar to Scan.plot_main()
         """
         self.figures = {}
+        y_plot_values = self.y_values / self.y_unit_value
+        xlabel = self.y_plot_label + f'[{self.y_plot_unit}]'
+        # Raise resolution of fit result for smooth plot. Same for all resonators.
+        x_fit = np.linspace(self.y_start, self.y_stop, self.y_points * 3)
+        x_fit_plot_values = x_fit / self.y_unit_value
         
         for i, rr in enumerate(self.readout_resonators):
             level_index = self.level_to_fit[i] - self.cfg[f'variables.{rr}/lowest_readout_levels']      
             title = f'{self.datetime_stamp}, {self.scan_name}, {rr}'
-            xlabel = self.y_plot_label + f'[{self.y_plot_unit}]'
             if self.classification_enable:
                 ylabel = fr'Difference of $P_{{\left|{self.level_to_fit[i]}\right\rangle}}$'
             else:
                 ylabel = 'Difference of I-Q Coordinate (Rotated) [a.u.]'
             
             fig, ax = plt.subplots(1, 1, dpi=150)
-            ax.plot(self.y_values / self.y_unit_value, self.measurement[rr]['to_fit'][level_index], 'k.')
+            ax.plot(y_plot_values, self.measurement[rr]['to_fit'][level_index], 'k.')
             ax.set(xlabel=xlabel, ylabel=ylabel, title=title)
             
             if self.fit_result[rr] is not None: 
-                # Raise resolution of fit result for smooth plot.
-                x = np.linspace(self.y_start, self.y_stop, self.y_points * 3)  
-                y = self.fit_result[rr].eval(x=x)
-                ax.plot(x / self.y_unit_value, y, 'm-')
+                y = self.fit_result[rr].eval(x=x_fit)
+                ax.plot(x_fit_plot_values, y, 'm-')
                 
                 # AnchoredText stolen from Ray's code.
                 fit_text = '\n'.join([f'{v.name} = {v.value:0.5g}' for v in self.fit_result[rr].params.values()])
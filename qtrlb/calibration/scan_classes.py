@@ -11,7 +11,7 @@ from qtrlb.utils.waveforms import get_waveform
 from qtrlb.processing.processing import rotate_IQ, gmm_fit, gmm_predict, normalize_population, \
     get_readout_fidelity, plot_corr_matrix, correct_population, two_tone_predict, two_tone_normalize, \
     multitone_predict_sequential, multitone_predict_mask, multitone_normalize, sort_points_by_distance, \
-    get_QNDness_matrix, plot_QNDness_matrix
+    get_QNDness_matrix, plot_QNDness_matrix, single_gaussian_fit
 from qtrlb.processing.fitting import SinModel, ExpSinModel, ExpModel, SpectroscopyModel
 
 
@@ -58,22 +58,23 @@ class DriveAmplitudeScan(Scan):
         we will use register R11 to store the gain for DRAG path.
         """
         super().add_xinit()
+        start = self.gain_translator(self.x_start)
 
         for tone in self.main_tones:
-            start = self.gain_translator(self.x_start)
             start_drag = self.gain_translator(self.x_start * self.cfg[f'variables.{tone}/DRAG_weight'])
             xinit = f"""
                     move             {start},R4     
                     move             {start_drag},R11
             """
-            self.sequences[tone]['program'] += xinit
+            self.sequences[tone]['program_parts'].append(xinit)
             
             
     def add_main(self):
+        step = self.gain_translator(self.x_step)
+
         for tone in self.main_tones:
             tone_dict = self.cfg[f'variables.{tone}']
             
-            step = self.gain_translator(self.x_step)
             step_drag = self.gain_translator(self.x_step * tone_dict['DRAG_weight'])
             freq = round((tone_dict['mod_freq'] + tone_dict['pulse_detuning']) * 4)
                     
@@ -90,14 +91,14 @@ class DriveAmplitudeScan(Scan):
                     add              R4,{step},R4
                     add              R11,{step_drag},R11
             """)
-            self.sequences[tone]['program'] += main
+            self.sequences[tone]['program_parts'].append(main)
 
         for tone in self.rest_tones:
             main = f"""
                  #-----------Main-----------
                     wait             {self.qubit_pulse_length_ns * self.error_amplification_factor}
             """            
-            self.sequences[tone]['program'] += main
+            self.sequences[tone]['program_parts'].append(main)
 
 
 class Spectroscopy(Scan):
@@ -150,12 +151,13 @@ class Spectroscopy(Scan):
             xinit = f"""
                     move             {ssb_freq_start_4},R4
             """
-            self.sequences[tone]['program'] += xinit
+            self.sequences[tone]['program_parts'].append(xinit)
             
             
     def add_main(self, gain: str = None, gain_drag: str = None):
+        step = self.frequency_translator(self.x_step)
+
         for tone in self.main_tones:
-            step = self.frequency_translator(self.x_step)
             if gain is None: gain = round(self.cfg[f'variables.{tone}']['amp_180'] * 32768)
             if gain_drag is None: gain_drag = round(gain * self.cfg[f'variables.{tone}']['DRAG_weight'])
 
@@ -172,14 +174,14 @@ class Spectroscopy(Scan):
                  + f""" 
                     add              R4,{step},R4
             """)
-            self.sequences[tone]['program'] += main
+            self.sequences[tone]['program_parts'].append(main)
 
         for tone in self.rest_tones:
             main = f"""
                  #-----------Main-----------
                     wait             {self.qubit_pulse_length_ns * self.error_amplification_factor}
             """            
-            self.sequences[tone]['program'] += main
+            self.sequences[tone]['program_parts'].append(main)
 
 
     def fit_data(self, x=None, **fitting_kwargs):
@@ -273,7 +275,7 @@ class RabiScan(Scan):
                     move             {start_ns},R4
                     move             {self.init_waveform_index},R11
         """
-        for tone in self.tones: self.sequences[tone]['program'] += xinit
+        for tone in self.tones: self.sequences[tone]['program_parts'].append(xinit)
         
         
     def add_main(self, freq: str = None, gain: str = None):
@@ -304,7 +306,7 @@ class RabiScan(Scan):
                     add              R11,1,R11
             """  
             
-            self.sequences[tone]['program'] += main
+            self.sequences[tone]['program_parts'].append(main)
 
         for tone in self.rest_tones:
             main = f"""
@@ -315,7 +317,7 @@ class RabiScan(Scan):
         end_main:   add              R4,{step_ns},R4
                     add              R11,1,R11
             """            
-            self.sequences[tone]['program'] += main
+            self.sequences[tone]['program_parts'].append(main)
             
             
     @property
@@ -360,9 +362,10 @@ class DebugRabi(RabiScan):
             ylabel = 'Coordinate (Rotated) [a.u.]'
             
             fig, ax = plt.subplots(1, 2, figsize=(13, 5))
-            ax[0].plot(self.x_values / self.x_unit_value, self.measurement[rr]['to_fit'][0], 'k.')
+            x_plot_values = self.x_values / self.x_unit_value
+            ax[0].plot(x_plot_values, self.measurement[rr]['to_fit'][0], 'k.')
             ax[0].set(xlabel=xlabel, ylabel=f'I-{ylabel}', title=title)
-            ax[1].plot(self.x_values / self.x_unit_value, self.measurement[rr]['to_fit'][1], 'k.')
+            ax[1].plot(x_plot_values, self.measurement[rr]['to_fit'][1], 'k.')
             ax[1].set(xlabel=xlabel, ylabel=f'Q-{ylabel}', title=title)
             
             if self.fit_result[rr] is not None: 
@@ -424,7 +427,7 @@ class T1Scan(Scan):
         xinit = f"""
                     move             {start_ns},R4            
         """
-        for tone in self.tones: self.sequences[tone]['program'] += xinit
+        for tone in self.tones: self.sequences[tone]['program_parts'].append(xinit)
         
         
     def add_main(self):
@@ -454,7 +457,7 @@ class T1Scan(Scan):
                     
         end_main:   add              R4,{step_ns},R4
         """
-        for tone in self.tones: self.sequences[tone]['program'] += main
+        for tone in self.tones: self.sequences[tone]['program_parts'].append(main)
         
 
 class RamseyScan(Scan):
@@ -517,7 +520,7 @@ class RamseyScan(Scan):
                     move             {start_ADphase},R12
                     move             {int(1e9)}, R14
         """
-        for tone in self.tones: self.sequences[tone]['program'] += xinit
+        for tone in self.tones: self.sequences[tone]['program_parts'].append(xinit)
         
         
     def add_main(self):
@@ -568,7 +571,7 @@ class RamseyScan(Scan):
                     add              R12,{step_ADphase},R12
         """
 
-        for tone in self.tones: self.sequences[tone]['program'] += main
+        for tone in self.tones: self.sequences[tone]['program_parts'].append(main)
         
         self.add_gate(half_pi_gate, 'Ramsey2ndHalfPIgate')
         
@@ -635,7 +638,7 @@ class EchoScan(Scan):
                     move             {start_ADphase},R12
                     move             {int(1e9)}, R14
         """
-        for tone in self.tones: self.sequences[tone]['program'] += xinit
+        for tone in self.tones: self.sequences[tone]['program_parts'].append(xinit)
         
         
     def add_main(self):
@@ -663,7 +666,7 @@ class EchoScan(Scan):
                     
         end_main1:  nop
         """
-        for tone in self.tones: self.sequences[tone]['program'] += main1
+        for tone in self.tones: self.sequences[tone]['program_parts'].append(main1)
         
         if self.echo_type == 'CP':
             pi_gate = {tone.split('/')[0]: [f'X180_{tone.split("/")[1]}'] for tone in self.main_tones}
@@ -706,7 +709,7 @@ class EchoScan(Scan):
                     add              R12,{step_ADphase},R12
         """
 
-        for tone in self.tones: self.sequences[tone]['program'] += main2
+        for tone in self.tones: self.sequences[tone]['program_parts'].append(main2)
         
         if self.reverse_last_gate: 
             half_pi_gate = {tone.split('/')[0]: [f'X-90_{tone.split("/")[1]}'] for tone in self.main_tones}
@@ -776,9 +779,10 @@ class LevelScan(Scan):
     def add_xinit(self):
         super().add_xinit()
         
-        for tone in self.tones: self.sequences[tone]['program'] += f"""
+        xinit = f"""
                     move             {self.x_start},R4            
         """
+        for tone in self.tones: self.sequences[tone]['program_parts'].append(xinit)
 
 
     def add_main(self):
@@ -786,22 +790,23 @@ class LevelScan(Scan):
         Here we add all PI gate to our sequence program based on level_stop.
         We will use R4 to represent level and jlt instruction to skip later PI gate.
         """
-        for tone in self.tones: self.sequences[tone]['program'] += """
+        for tone in self.tones: self.sequences[tone]['program_parts'].append("""
                 #-----------Main-----------
                     jlt              R4,1,@end_main    
-        """         
+        """)         
 
         for level in range(self.x_stop):
             self.add_gate(gate = {q: [f'X180_{level}{level+1}'] for q in self.drive_qubits},
                           name = f'XPI{level}{level+1}')
             
-            for tone in self.tones: self.sequences[tone]['program'] += f"""
+            jump = f"""
                     jlt              R4,{level+2},@end_main    
         """
+            for tone in self.tones: self.sequences[tone]['program_parts'].append(jump)
             
-        for tone in self.tones: self.sequences[tone]['program'] += """
+        for tone in self.tones: self.sequences[tone]['program_parts'].append("""
         end_main:   add              R4,1,R4    
-        """
+        """)
         
         
 class CalibrateClassification(LevelScan):
@@ -858,7 +863,7 @@ class CalibrateClassification(LevelScan):
                     if not (isinstance(subtone_dict, dict) and 'Heterodyned_readout' in subtone_dict): continue
 
                     angle = self.cfg[f'process.{rr}/{subtone}/IQ_rotation_angle']
-                    subtone_dict['Reshaped_readout'] = np.array(subtone_dict['Heterodyned_readout']).reshape(shape)
+                    subtone_dict['Reshaped_readout'] = np.asarray(subtone_dict['Heterodyned_readout']).reshape(shape)
                     subtone_dict['IQrotated_readout'] = rotate_IQ(subtone_dict['Reshaped_readout'], angle)
 
         
@@ -875,23 +880,20 @@ class CalibrateClassification(LevelScan):
                 axis=0)
             
             # First fit GMM parameters for each level separately
-            means = np.zeros((self.x_points, multitone_IQ_readout.shape[0]))
-            covariances = np.zeros((self.x_points, multitone_IQ_readout.shape[0]))
+            # Single component fit is just sample mean and variance, so we don't need gmm_fit here.
+            mask = data_dict['Mask_heralding'] if self.heralding_enable else None
 
-            for i in range(self.x_points):
-                mask = None
-                data = multitone_IQ_readout[..., i]
-                
-                if self.heralding_enable:
-                    mask = data_dict['Mask_heralding']
-                    data = data[:, mask[:,i] == 0]
-                    # Here the multitone_IQ_readout has shape (2*n_tones, n_reps, x_points)
-                    # mask has shape (n_reps, x_points)
-                
-                gmm = gmm_fit(data, n_components=1)
-                means[i] = gmm.means_[0]
-                covariances[i] = gmm.covariances_[0]
-                # Because the default form is one more layer nested.
+            if mask is None:
+                means, covariances = single_gaussian_fit(multitone_IQ_readout)
+            else:
+                # Each level keeps different repetitions after heralding, so we still loop over them.
+                # Here the multitone_IQ_readout has shape (2*n_tones, n_reps, x_points)
+                # mask has shape (n_reps, x_points)
+                means = np.zeros((self.x_points, multitone_IQ_readout.shape[0]))
+                covariances = np.zeros((self.x_points, multitone_IQ_readout.shape[0]))
+
+                for i in range(self.x_points):
+                    means[i], covariances[i] = single_gaussian_fit(multitone_IQ_readout[:, mask[:,i] == 0, i])
 
             # Refit with multi-component model.
             # It's better for poor state preparation or decay during readout.
@@ -1038,11 +1040,10 @@ class CalibrateTOF(JustGate):
         Start and stop set the limit of x axis.
         """
         rr, subtone = self.readout_tones[0].split('/')  # We should use only one readout_tone.
-        self.raw_data = np.array(self.measurement[rr][subtone]['raw_readout'])
+        self.raw_data = np.asarray(self.measurement[rr][subtone]['raw_readout'])
 
         t = np.arange(16384)
-        I_trace = np.mean(self.raw_data, axis=1)[0]
-        Q_trace = np.mean(self.raw_data, axis=1)[1]
+        I_trace, Q_trace = np.mean(self.raw_data, axis=1, dtype=np.float64)  # Accumulate float32 traces in float64.
 
         fig, ax = plt.subplots(2, 1, dpi=150)
         ax[0].plot(t[start:stop], I_trace[start:stop])
@@ -1265,20 +1266,12 @@ class TwoToneROCalibration(LevelScan):
         for r, readout_levels in self.readout_levels_dict.items():
             # Initial process
             data_dict = self.measurement[r]
-            data_dict['Reshaped_readout'] = np.array(data_dict['Heterodyned_readout']).reshape(shape)
+            data_dict['Reshaped_readout'] = np.asarray(data_dict['Heterodyned_readout']).reshape(shape)
             data_dict['IQrotated_readout'] = rotate_IQ(data_dict['Reshaped_readout'], 
                                                        angle=self.cfg.process[f'{r}/IQ_rotation_angle'])
             
-            # GMM fitting
-            means = np.zeros((len(readout_levels), 2))
-            covariances = np.zeros(len(readout_levels))
-
-            for i, l in enumerate(readout_levels):
-                data = data_dict['IQrotated_readout'][..., l]
-                mean, covariance = gmm_fit(data, n_components=1)
-                means[i] = mean[0]
-                covariances[i] = covariance[0]
-                # Because the default form is one more layer nested.
+            # GMM fitting. Single component fit is just sample mean and variance of each level.
+            means, covariances = single_gaussian_fit(data_dict['IQrotated_readout'][..., readout_levels])
 
             # Using fitting result to re-predict state.
             data_dict['means_new'] = means
@@ -1411,7 +1404,7 @@ class MultitoneROCalibration(LevelScan):
             # Fit GMM parameters for each level separately
             readout_levels = self.cfg.variables[f'{r}/readout_levels']
             means = np.zeros((len(readout_levels), 2))
-            covariances = np.zeros(len(readout_levels))
+            covariances = np.zeros((len(readout_levels), 2))
 
             for i, l in enumerate(readout_levels):
                 mask_heralding = None
@@ -1428,10 +1421,7 @@ class MultitoneROCalibration(LevelScan):
                     # Here the data_dict['IQrotated_readout'] has shape (2, n_reps, x_points)
                     # All mask have shape (n_reps, x_points)
 
-                mean, covariance = gmm_fit(data, n_components=1)
-                means[i] = mean[0]
-                covariances[i] = covariance[0]
-                # Because the default form is one more layer nested.
+                means[i], covariances[i] = single_gaussian_fit(data)
 
 
             # Refit with multi-component model.
@@ -1440,7 +1430,8 @@ class MultitoneROCalibration(LevelScan):
                 data = data_dict['IQrotated_readout'][..., readout_levels]
                 if self.heralding_enable: data = data.reshape(2, -1)[:, mask_heralding[:,readout_levels].flatten() == 0]
 
-                means_new, covariances_new = gmm_fit(data, n_components=len(readout_levels))
+                gmm = gmm_fit(data, n_components=len(readout_levels))
+                means_new, covariances_new = gmm.means_, gmm.covariances_
                 indices = sort_points_by_distance(means_new, means)
                 means = means_new[indices]
                 covariances = covariances_new[indices]
@@ -26,8 +26,11 @@ class DACManager(Config):
         super().load()
 
         # Connect to instrument.
+        # active_maps is the set of (sequencer, channel map) we enabled. None means unknown, like after reset.
         Cluster.close_all()
         self.test_mode = test_mode
+        self.active_maps = None
+        self.last_tones = None
         if self.test_mode:
             dummy_cfg = {2:'Cluster QCM-RF', 6:'Cluster QCM-RF', 10:'Cluster QCM-RF', 14:'Cluster QRM-RF'}
             self.qblox = Cluster(name='cluster', dummy_cfg=dummy_cfg)
@@ -53,6 +56,9 @@ class DACManager(Config):
             self.module[tone] = getattr(self.qblox, 'module{}'.format(self.varman[f'{tone}/mod']))
             self.sequencer[tone] = getattr(self.module[tone], 'sequencer{}'.format(self.varman[f'{tone}/seq']))
 
+        # Tones may be mapped to other module/sequencer now. Force a reset at next implement_parameters.
+        self.last_tones = None
+
 
     def reset(self):
         """
@@ -63,62 +69,88 @@ class DACManager(Config):
         self.set_automated_control(self['automated_control'])
         if not self['automated_control']: self.set_fan_speed(self['fan_speed'])
 
+        # All channel maps go back to default, so we no longer know which of them are enabled.
+        self.active_maps = None
+        self.last_tones = None
+
         
     def implement_parameters(self, tones: list, jsons_path: str):
         """
         Implement the setting/parameters onto Qblox.
         This function should be called after we know which specific tones will be used.
         The tones should be list of string like: ['Q3/01', 'Q3/12', 'Q3/23', 'Q4/01', 'Q4/12', 'R3', 'R4'].
+
+        Reset and disconnecting every channel map of every sequencer cost a lot of SCPI calls at each Scan.
+        When the tones are same as last call, we skip the reset since all their parameters will be set again below.
+        We also only disable the channel maps we enabled ourselves, unless we don't know them after a reset.
+        Call reset() before it if you changed the instrument by hand and want a clean start.
         """
-        self.reset()
+        tones = list(tones)
+        if tones != self.last_tones: self.reset()
+        self.last_tones = None  # In case we fail in the middle.
         self.disconnect_existed_map()
         self.disable_all_lo()
         
+        # Tones can share module and output port. Their common parameters and LO only need to be set once.
+        implemented_modules = set()
+        implemented_lo = set()
+
         for tone in tones:
             tone_ = tone.replace('/', '_')
-            mod = self.varman[f'{tone}/mod']  # A string of integer index for convenience.
-            out = self.varman[f'{tone}/out']
-            seq = self.varman[f'{tone}/seq']
+            tone_dict = self.varman[tone]
+            mod = tone_dict['mod']  # A string of integer index for convenience.
+            out = tone_dict['out']
+            seq = tone_dict['seq']
+            module = self.module[tone]
+            sequencer = self.sequencer[tone]
+            module_dict = self[f'Module{mod}']
 
             # Implement common parameters.
-            for key, value in self[f'Module{mod}'].items():
-                if key.startswith(('out', 'in', 'scope')): getattr(self.module[tone], key)(value)
+            if mod not in implemented_modules:
+                implemented_modules.add(mod)
+                for key, value in module_dict.items():
+                    if key.startswith(('out', 'in', 'scope')): getattr(module, key)(value)
 
             # Implement QCM-RF specific parameters.
             if tone.startswith('Q'):
-                getattr(self.module[tone], f'out{out}_lo_en')(True)
-                time.sleep(0.005)  # This 5ms sleep is important to make LO work correctly. 1ms doesn't work.
-                getattr(self.module[tone], f'out{out}_lo_freq')(self.varman[f'lo_freq/M{mod}O{out}'])
-                self.sequencer[tone].sync_en(True)
-                self.sequencer[tone].mod_en_awg(True)
-                getattr(self.sequencer[tone], f'channel_map_path0_out{out*2}_en')(True)
-                getattr(self.sequencer[tone], f'channel_map_path1_out{out*2+1}_en')(True)
+                if (mod, out) not in implemented_lo:
+                    implemented_lo.add((mod, out))
+                    getattr(module, f'out{out}_lo_en')(True)
+                    time.sleep(0.005)  # This 5ms sleep is important to make LO work correctly. 1ms doesn't work.
+                    getattr(module, f'out{out}_lo_freq')(self.varman[f'lo_freq/M{mod}O{out}'])
+                sequencer.sync_en(True)
+                sequencer.mod_en_awg(True)
+                self.enable_map(sequencer, f'channel_map_path0_out{out*2}_en')
+                self.enable_map(sequencer, f'channel_map_path1_out{out*2+1}_en')
                 
             # Implement QRM-RF specific parameters.
             elif tone.startswith('R'):
-                self.module[tone].out0_in0_lo_en(True)
-                time.sleep(0.005)  # This 5ms sleep is important to make LO work correctly. 1ms doesn't work.
-                self.module[tone].out0_in0_lo_freq(self.varman[f'lo_freq/M{mod}O{out}'])
-                self.module[tone].scope_acq_sequencer_select(seq)  # Last sequencer to triger acquire.
-                self.sequencer[tone].sync_en(True)
-                self.sequencer[tone].mod_en_awg(True)
-                self.sequencer[tone].demod_en_acq(True)
-                self.sequencer[tone].integration_length_acq(round(self.varman['common/integration_length'] * 1e9))
-                self.sequencer[tone].nco_prop_delay_comp_en(self.varman['common/nco_delay_comp'])
-                self.sequencer[tone].channel_map_path0_out0_en(True)
-                self.sequencer[tone].channel_map_path1_out1_en(True)
+                if (mod, out) not in implemented_lo:
+                    implemented_lo.add((mod, out))
+                    module.out0_in0_lo_en(True)
+                    time.sleep(0.005)  # This 5ms sleep is important to make LO work correctly. 1ms doesn't work.
+                    module.out0_in0_lo_freq(self.varman[f'lo_freq/M{mod}O{out}'])
+                module.scope_acq_sequencer_select(seq)  # Last sequencer to triger acquire.
+                sequencer.sync_en(True)
+                sequencer.mod_en_awg(True)
+                sequencer.demod_en_acq(True)
+                sequencer.integration_length_acq(round(self.varman['common/integration_length'] * 1e9))
+                sequencer.nco_prop_delay_comp_en(self.varman['common/nco_delay_comp'])
+                self.enable_map(sequencer, 'channel_map_path0_out0_en')
+                self.enable_map(sequencer, 'channel_map_path1_out1_en')
                   
             # Correct sideband tone of mixer. Nulling LO tone was applied in common parameters.
-            self.sequencer[tone].mixer_corr_gain_ratio(
-                self[f'Module{mod}/Sequencer{seq}/mixer_corr_gain_ratio']
-            )           
-            self.sequencer[tone].mixer_corr_phase_offset_degree(
-                self[f'Module{mod}/Sequencer{seq}/mixer_corr_phase_offset_degree']
-            )
+            sequencer_dict = module_dict[f'Sequencer{seq}']
+            sequencer.mixer_corr_gain_ratio(sequencer_dict['mixer_corr_gain_ratio'])           
+            sequencer.mixer_corr_phase_offset_degree(sequencer_dict['mixer_corr_phase_offset_degree'])
             
             # Upload sequence json file to instrument.
+            # It stays serial on purpose: all sequencers talk through the one SCPI connection of the Cluster.
+            # The json files themselves are already written in parallel by Scan.save_sequence().
             file_path = os.path.join(jsons_path, f'{tone_}_sequence.json')
-            self.sequencer[tone].sequence(file_path)
+            sequencer.sequence(file_path)
+
+        self.last_tones = tones
     
 
     def set_automated_control(self, on: bool) -> None:
@@ -148,7 +180,14 @@ class DACManager(Config):
         """
         Disconnect all existed maps between two output paths of each output port 
         and two output paths of each sequencer.
+        If we know which maps are enabled by us, only those will be disabled.
         """
+        if self.active_maps is not None:
+            for sequencer, name in self.active_maps:
+                sequencer.set(name, False)
+            self.active_maps = set()
+            return
+
         for module in self.qblox.modules:
             if not (module.present() and module.is_rf_type): continue
 
@@ -166,6 +205,17 @@ class DACManager(Config):
 
             else:
                 print(f'Failed to disconnect channel map for module type {module.module_type}')
+
+        self.active_maps = set()
+
+
+    def enable_map(self, sequencer, name: str):
+        """
+        Enable one channel map of the sequencer and remember it for disconnect_existed_map.
+        The name should be string like 'channel_map_path0_out0_en'.
+        """
+        sequencer.set(name, True)
+        if self.active_maps is not None: self.active_maps.add((sequencer, name))
             
 
     def disable_all_lo(self):
@@ -185,10 +235,42 @@ class DACManager(Config):
                 print(f'Failed to disable LO for module type {module.module_type}')
 
 
-    def start_sequencer(self, tones: list, measurement: dict, keep_raw: bool = False, heralding_enable: bool = False):
+    def start_sequencer_batch(self, tones: list, measurement: dict, n_pyloops: int, 
+                              keep_raw: bool = False, heralding_enable: bool = False):
+        """
+        Run the sequencers n_pyloops times and fill index 0 to n_pyloops-1 of the arrays in measurement.
+        The module, sequencer index and timeout of readout tones are resolved only once for all runs.
+        """
+        readout_info = self.get_readout_info(tones)
+
+        for i in range(n_pyloops):
+            self.start_sequencer(tones, measurement, i, keep_raw, heralding_enable, readout_info)
+            print(f'DACManager: Pyloop {i} finished!')
+
+
+    def get_readout_info(self, tones: list) -> list[tuple]:
+        """
+        Return list of (rr, subtone, module, seq_idx, timeout) for each readout tone in tones.
+        """
+        readout_info = []
+        for rt in tones:
+            # Only loop over readout_tone.
+            if not rt.startswith('R'): continue
+            rr, subtone = rt.split('/')
+            timeout = self['Module{}/acquisition_timeout'.format(self.varman[f'{rt}/mod'])]
+            seq_idx = int(self.varman[f'{rt}/seq'])
+            readout_info.append((rr, subtone, self.module[rt], seq_idx, timeout))
+        return readout_info
+
+
+    def start_sequencer(self, tones: list, measurement: dict, pyloop: int = 0, 
+                        keep_raw: bool = False, heralding_enable: bool = False, readout_info: list = None):
         """
         Ask the instrument to start sequencer.
         Then store the Heterodyned result into measurement.
+        The arrays in measurement should be preallocated with shape (2, n_pyloops, ...).
+        Result of this run will be written into index pyloop of their second axis.
+        The readout_info from get_readout_info() can be passed in to skip resolving it again.
         
         Reference about data structure:
         https://qblox-qblox-instruments.readthedocs-hosted.com/en/master/api_reference/cluster.html#qblox_instruments.native.Cluster.get_acquisitions
@@ -200,50 +282,52 @@ class DACManager(Config):
         Which means for Scan, only the raw trace belong to last point in x_points will be stored.
         So it's barely useful, but I still leave the interface here.
         """
+        if readout_info is None: readout_info = self.get_readout_info(tones)
+
         # Arm sequencer first. It's necessary. Only armed sequencer will be started next.
+        # Don't use qblox.arm_sequencer() without index to arm them in one call. It arms every sequencer, \
+        # including those not used in this Scan that may still hold program from last Scan.
         for tone in tones:
             self.sequencer[tone].arm_sequencer()
             
         # Really start sequencer.
         self.qblox.start_sequencer()  
 
-        for rt in tones:
-            # Only loop over readout_tone.
-            if not rt.startswith('R'): continue
-            rr, subtone = rt.split('/')
-
-            timeout = self['Module{}/acquisition_timeout'.format(self.varman[f'{rt}/mod'])]
-            seq_idx = int(self.varman[f'{rt}/seq'])
-           
+        # Retrieval stays sequential. All modules share one SCPI connection of the Cluster, so threads can't overlap \
+        # the round trips. While we read one sequencer, the others keep acquiring, so the waits already overlap.
+        for rr, subtone, module, seq_idx, timeout in readout_info:
             # Wait the timeout in minutes and ask whether the acquisition finish on that sequencer. Raise error if not.
-            self.module[rt].get_acquisition_state(seq_idx, timeout)  
+            module.get_acquisition_state(seq_idx, timeout)  
 
             # Store the raw (scope) data from buffer of FPGA to RAM of instrument.
             if keep_raw: 
-                self.module[rt].store_scope_acquisition(seq_idx, 'readout')
-                if heralding_enable: self.module[rt].store_scope_acquisition(seq_idx, 'heralding')
+                module.store_scope_acquisition(seq_idx, 'readout')
+                if heralding_enable: module.store_scope_acquisition(seq_idx, 'heralding')
             
             # Retrive the heterodyned result (binned data) back to python in Host PC.
-            data = self.module[rt].get_acquisitions(seq_idx)
+            data = module.get_acquisitions(seq_idx)
             
             # Clear the memory of instrument. 
             # It's necessary otherwise the acquisition result will accumulate and be averaged.
-            self.module[rt].delete_acquisition_data(seq_idx, 'readout')
-            if heralding_enable: self.module[rt].delete_acquisition_data(seq_idx, 'heralding')
+            # Sequencer only has 'readout' and 'heralding' acquisitions, so we clear both with one call.
+            module.delete_acquisition_data(seq_idx, all=True)
             
-            # Append list of each repetition into measurement dictionary.
-            measurement[rr][subtone]['Heterodyned_readout'][0].append(data['readout']['acquisition']['bins']['integration']['path0']) 
-            measurement[rr][subtone]['Heterodyned_readout'][1].append(data['readout']['acquisition']['bins']['integration']['path1'])
+            # Write result of this repetition into the preallocated arrays in measurement dictionary.
+            subtone_dict = measurement[rr][subtone]
+            readout = data['readout']['acquisition']
+            subtone_dict['Heterodyned_readout'][0, pyloop] = readout['bins']['integration']['path0']
+            subtone_dict['Heterodyned_readout'][1, pyloop] = readout['bins']['integration']['path1']
             if heralding_enable:
-                measurement[rr][subtone]['Heterodyned_heralding'][0].append(data['heralding']['acquisition']['bins']['integration']['path0']) 
-                measurement[rr][subtone]['Heterodyned_heralding'][1].append(data['heralding']['acquisition']['bins']['integration']['path1'])
+                heralding = data['heralding']['acquisition']
+                subtone_dict['Heterodyned_heralding'][0, pyloop] = heralding['bins']['integration']['path0']
+                subtone_dict['Heterodyned_heralding'][1, pyloop] = heralding['bins']['integration']['path1']
 
             if keep_raw:
-                measurement[rr][subtone]['raw_readout'][0].append(data['readout']['acquisition']['scope']['path0']['data']) 
-                measurement[rr][subtone]['raw_readout'][1].append(data['readout']['acquisition']['scope']['path1']['data'])
+                subtone_dict['raw_readout'][0, pyloop] = readout['scope']['path0']['data']
+                subtone_dict['raw_readout'][1, pyloop] = readout['scope']['path1']['data']
                 if heralding_enable:
-                    measurement[rr][subtone]['raw_heralding'][0].append(data['heralding']['acquisition']['scope']['path0']['data']) 
-                    measurement[rr][subtone]['raw_heralding'][1].append(data['heralding']['acquisition']['scope']['path1']['data'])
+                    subtone_dict['raw_heralding'][0, pyloop] = heralding['scope']['path0']['data']
+                    subtone_dict['raw_heralding'][1, pyloop] = heralding['scope']['path1']['data']
 
         # In case of the sequencers don't stop correctly.
         # Do not call qblox.reset() here since it will make debugging difficult.
@@ -1,10 +1,16 @@
 import os
 import numpy as np
 from copy import deepcopy
+from functools import lru_cache
 from ruamel.yaml import YAML
 from ruamel.yaml.main import round_trip_dump
 
 
+# Parsed yaml files keyed by path, with the (mtime, size) they were parsed at.
+# Pure python YAML parsing is slow and every Scan reloads the same files, so we only parse when file changed.
+YAML_CACHE = {}
+
+
 class Config:
     """ This is the parent class of all managers, which loads and stores a 
         YAML config_dict file, provides a dictionary like interface to the 
@@ -39,12 +45,22 @@ class Config:
         Raise error if the structure has inconsistency.
         Generate attribute self.config_raw if all check pass.
         The YAML object help to load yaml file directly to python dictionary.
+        If the file hasn't changed since last parsing, we copy the cached dictionary instead.
         """
         # Check the things are actually there.
         try:  
-            yaml = YAML(typ='safe', pure=True)
-            with open(self.raw_file_path, 'r') as f:
-                self.config_raw = yaml.load(f)
+            stat = os.stat(self.raw_file_path)
+            file_key = (stat.st_mtime_ns, stat.st_size)
+            cached = YAML_CACHE.get(self.raw_file_path)
+
+            if cached is None or cached[0] != file_key:
+                yaml = YAML(typ='safe', pure=True)
+                with open(self.raw_file_path, 'r') as f:
+                    cached = (file_key, yaml.load(f))
+                YAML_CACHE[self.raw_file_path] = cached
+
+            # Always give a copy since config_raw will be changed by set().
+            self.config_raw = deepcopy(cached[1])
 
         except FileNotFoundError:
             print(f'Config: Missing {self.suffix} Yaml file. Please check your working directory!!!')
@@ -146,7 +162,7 @@ class Config:
             key: str. String of keys separated by forward slash.
             which : str. Choose which dictionary we look up. Should only be 'dict' or 'raw'.
         """
-        keys_list = self.slashed_string_to_list(key)
+        keys_list = self.slashed_string_to_tuple(key) if isinstance(key, str) else self.slashed_string_to_list(key)
         
         # Choose which dictionary to look up.
         if which == 'dict':
@@ -257,6 +273,17 @@ class Config:
         return result
             
             
+    @staticmethod
+    @lru_cache(maxsize=4096)
+    def slashed_string_to_tuple(string: str) -> tuple:
+        """
+        Cached version of slashed_string_to_list for get().
+        Same keys like 'Q0/01/freq' are looked up again and again, so we only split each of them once.
+        We cache the parsed keys instead of the value, so it never goes stale when the dictionary changes.
+        """
+        return tuple(Config.slashed_string_to_list(string))
+            
+            
     @staticmethod
     def recursively_set(config_dict: dict, keys_list: list, value):
         """
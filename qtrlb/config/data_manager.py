@@ -52,6 +52,7 @@ class DataManager(Config):
         self.yamls_path = os.path.join(self.data_path, 'Yamls')
         self.jsons_path = os.path.join(self.data_path, 'Jsons')
         
+        # Don't use exist_ok=True here. An existing directory means we may overwrite data and user should know it.
         try:
             os.makedirs(self.yamls_path)
             os.makedirs(self.jsons_path)
@@ -106,6 +107,8 @@ class DataManager(Config):
     def save_dict_to_hdf5(dictionary: dict, h5: h5py.File | h5py.Group):
         """
         Recursively save a nested dictionary to hdf5 file/group. 
+        Large numeric arrays (raw and heterodyned data) are chunked and compressed with LZF, \
+        which is fast enough to not slow down saving and is supported by h5py out of box.
         """
         for k, v in dictionary.items():
             if isinstance(v, dict):
@@ -113,6 +116,8 @@ class DataManager(Config):
                 DataManager.save_dict_to_hdf5(v, subgroup)
             elif v is None:
                 continue
+            elif isinstance(v, np.ndarray) and v.size >= 4096 and v.dtype.kind in 'biufc':
+                h5.create_dataset(k, data = v, chunks=True, compression='lzf', shuffle=True)
             else:
                 h5.create_dataset(k, data = v)
 
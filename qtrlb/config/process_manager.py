@@ -86,25 +86,9 @@ class ProcessManager(Config):
 
             # Loop over each resonator
             for rr, data_dict in measurement.items():
-                # Loop over its subtones and collect all IQ.   
-                multitone_IQ_readout = []
-                multitone_IQ_heralding = []
-                for subtone, subtone_dict in data_dict.items():
-                    # Check whether k is name of subtones. Otherwise if k is process name, we skip it.
-                    if not (isinstance(subtone_dict, dict) and 'Heterodyned_readout' in subtone_dict): continue
-
-                    subtone_dict['Reshaped_readout'] = np.array(subtone_dict['Heterodyned_readout']).reshape(shape)
-                    subtone_dict['Reshaped_heralding'] = np.array(subtone_dict['Heterodyned_heralding']).reshape(shape)
-
-                    subtone_dict['IQrotated_readout'] = rotate_IQ(subtone_dict['Reshaped_readout'], 
-                                                                  angle=self[f'{rr}/{subtone}/IQ_rotation_angle'])
-                    subtone_dict['IQrotated_heralding'] = rotate_IQ(subtone_dict['Reshaped_heralding'], 
-                                                                    angle=self[f'{rr}/{subtone}/IQ_rotation_angle'])
-                    multitone_IQ_readout.append(subtone_dict['IQrotated_readout'])
-                    multitone_IQ_heralding.append(subtone_dict['IQrotated_heralding'])
-
-                multitone_IQ_readout = np.concatenate(multitone_IQ_readout, axis=0)
-                multitone_IQ_heralding = np.concatenate(multitone_IQ_heralding, axis=0)
+                # Rotate its subtones and collect all IQ.   
+                multitone_IQ_readout = self.rotate_multitone_IQ(rr, data_dict, shape, 'readout')
+                multitone_IQ_heralding = self.rotate_multitone_IQ(rr, data_dict, shape, 'heralding')
 
                 data_dict['GMMpredicted_readout'] = gmm_predict(multitone_IQ_readout, 
                                                                 means=self[f'{rr}/IQ_means'], 
@@ -135,18 +119,8 @@ class ProcessManager(Config):
         elif self['classification'] is True:
             # Loop over each resonator
             for rr, data_dict in measurement.items():
-                # Loop over its subtones and collect all IQ.   
-                multitone_IQ_readout = []
-                for subtone, subtone_dict in data_dict.items():
-                    # Check whether k is name of subtones. Otherwise if k is process name, we skip it.
-                    if not (isinstance(subtone_dict, dict) and 'Heterodyned_readout' in subtone_dict): continue
-
-                    subtone_dict['Reshaped_readout'] = np.array(subtone_dict['Heterodyned_readout']).reshape(shape)
-                    subtone_dict['IQrotated_readout'] = rotate_IQ(subtone_dict['Reshaped_readout'], 
-                                                                  angle=self[f'{rr}/{subtone}/IQ_rotation_angle'])
-                    multitone_IQ_readout.append(subtone_dict['IQrotated_readout'])
-
-                multitone_IQ_readout = np.concatenate(multitone_IQ_readout, axis=0)
+                # Rotate its subtones and collect all IQ.
+                multitone_IQ_readout = self.rotate_multitone_IQ(rr, data_dict, shape, 'readout')
                 
                 data_dict['GMMpredicted_readout'] = gmm_predict(multitone_IQ_readout, 
                                                                 means=self[f'{rr}/IQ_means'], 
@@ -166,18 +140,8 @@ class ProcessManager(Config):
         else:
             # Loop over each resonator
             for rr, data_dict in measurement.items():
-                # Loop over its subtones and collect all IQ.  
-                multitone_IQ_readout = []
-                for subtone, subtone_dict in data_dict.items():
-                    # Check whether k is name of subtones. Otherwise if k is process name, we skip it.
-                    if not (isinstance(subtone_dict, dict) and 'Heterodyned_readout' in subtone_dict): continue
-
-                    subtone_dict['Reshaped_readout'] = np.array(subtone_dict['Heterodyned_readout']).reshape(shape)
-                    subtone_dict['IQrotated_readout'] = rotate_IQ(subtone_dict['Reshaped_readout'], 
-                                                                  angle=self[f'{rr}/{subtone}/IQ_rotation_angle'])
-                    multitone_IQ_readout.append(subtone_dict['IQrotated_readout'])
-
-                multitone_IQ_readout = np.concatenate(multitone_IQ_readout, axis=0)
+                # Rotate its subtones and collect all IQ.
+                multitone_IQ_readout = self.rotate_multitone_IQ(rr, data_dict, shape, 'readout')
 
                 data_dict['IQaveraged_readout'] = np.mean(multitone_IQ_readout, axis=1)
 
@@ -191,6 +155,29 @@ class ProcessManager(Config):
 
 
 
+    def rotate_multitone_IQ(self, rr: str, data_dict: dict, shape: tuple, name: str = 'readout') -> np.ndarray:
+        """
+        Reshape and rotate the Heterodyned IQ of all subtones of resonator rr.
+        Return the multitone IQ with shape (2 * n_subtones, ...), which is the input of GMM prediction.
+        The multitone array is allocated once and each subtone writes its rotated IQ into its own slice.
+        So subtone_dict[f'IQrotated_{name}'] is a view of it and we don't need to concatenate them again.
+        """
+        # Check whether k is name of subtones. Otherwise if k is process name, we skip it.
+        subtones = [subtone for subtone, subtone_dict in data_dict.items() 
+                    if isinstance(subtone_dict, dict) and 'Heterodyned_readout' in subtone_dict]
+        multitone_IQ = np.empty((2 * len(subtones), *shape[1:]))
+
+        for i, subtone in enumerate(subtones):
+            subtone_dict = data_dict[subtone]
+            subtone_dict[f'Reshaped_{name}'] = np.asarray(subtone_dict[f'Heterodyned_{name}']).reshape(shape)
+            subtone_dict[f'IQrotated_{name}'] = rotate_IQ(subtone_dict[f'Reshaped_{name}'], 
+                                                          angle=self[f'{rr}/{subtone}/IQ_rotation_angle'],
+                                                          out=multitone_IQ[2*i : 2*i+2])
+        return multitone_IQ
+
+
+
+
     ##################################################           
     # All functions below are different customized data processing.
     # Use them by change customized_data_process in variables.yaml
@@ -216,7 +203,7 @@ class ProcessManager(Config):
         """
         # Normal GMM prediction as classification.
         for r, data_dict in measurement.items():  
-            data_dict['Reshaped_readout'] = np.array(data_dict['Heterodyned_readout']).reshape(shape)
+            data_dict['Reshaped_readout'] = np.asarray(data_dict['Heterodyned_readout']).reshape(shape)
             
             data_dict['IQrotated_readout'] = rotate_IQ(data_dict['Reshaped_readout'], 
                                                        angle=self[f'{r}/IQ_rotation_angle'])
@@ -277,7 +264,7 @@ class ProcessManager(Config):
         """
         # Normal GMM prediction as classification.
         for r, data_dict in measurement.items():  
-            data_dict['Reshaped_readout'] = np.array(data_dict['Heterodyned_readout']).reshape(shape)
+            data_dict['Reshaped_readout'] = np.asarray(data_dict['Heterodyned_readout']).reshape(shape)
             
             data_dict['IQrotated_readout'] = rotate_IQ(data_dict['Reshaped_readout'], 
                                                        angle=self[f'{r}/IQ_rotation_angle'])
@@ -331,7 +318,7 @@ class ProcessManager(Config):
         """
         # Normal GMM prediction as classification.
         for r, data_dict in measurement.items():  
-            data_dict['Reshaped_readout'] = np.array(data_dict['Heterodyned_readout']).reshape(shape)
+            data_dict['Reshaped_readout'] = np.asarray(data_dict['Heterodyned_readout']).reshape(shape)
             data_dict['IQrotated_readout'] = rotate_IQ(data_dict['Reshaped_readout'], 
                                                        angle=self[f'{r}/IQ_rotation_angle'])
             data_dict['GMMpredicted_readout'] = gmm_predict(data_dict['IQrotated_readout'], 
@@ -345,7 +332,7 @@ class ProcessManager(Config):
         mask_heralding = None
         if self['heralding'] is True:
             for r, data_dict in measurement.items():  
-                data_dict['Reshaped_heralding'] = np.array(data_dict['Heterodyned_heralding']).reshape(shape)
+                data_dict['Reshaped_heralding'] = np.asarray(data_dict['Heterodyned_heralding']).reshape(shape)
                 data_dict['IQrotated_heralding'] = rotate_IQ(data_dict['Reshaped_heralding'], 
                                                              angle=self[f'{r}/IQ_rotation_angle'])           
                 data_dict['GMMpredicted_heralding'] = gmm_predict(data_dict['IQrotated_heralding'], 
@@ -405,7 +392,7 @@ class ProcessManager(Config):
         """
         # Normal GMM prediction as classification.
         for r, data_dict in measurement.items():  
-            data_dict['Reshaped_readout'] = np.array(data_dict['Heterodyned_readout']).reshape(shape)
+            data_dict['Reshaped_readout'] = np.asarray(data_dict['Heterodyned_readout']).reshape(shape)
             data_dict['IQrotated_readout'] = rotate_IQ(data_dict['Reshaped_readout'], 
                                                        angle=self[f'{r}/IQ_rotation_angle'])
             data_dict['GMMpredicted_readout'] = gmm_predict(data_dict['IQrotated_readout'], 
@@ -446,7 +433,7 @@ class ProcessManager(Config):
         # But I believe it make code easy to read and is not the performance bottleneck yet.
         if self['heralding'] is True:
             for r, data_dict in measurement.items():  
-                data_dict['Reshaped_heralding'] = np.array(data_dict['Heterodyned_heralding']).reshape(shape)
+                data_dict['Reshaped_heralding'] = np.asarray(data_dict['Heterodyned_heralding']).reshape(shape)
                 data_dict['IQrotated_heralding'] = rotate_IQ(data_dict['Reshaped_heralding'], 
                                                              angle=self[f'{r}/IQ_rotation_angle'])           
                 data_dict['GMMpredicted_heralding'] = gmm_predict(data_dict['IQrotated_heralding'], 
@@ -515,7 +502,7 @@ class ProcessManager(Config):
         """
         # Normal GMM prediction as classification.
         for r, data_dict in measurement.items():  
-            data_dict['Reshaped_readout'] = np.array(data_dict['Heterodyned_readout']).reshape(shape)
+            data_dict['Reshaped_readout'] = np.asarray(data_dict['Heterodyned_readout']).reshape(shape)
             data_dict['IQrotated_readout'] = rotate_IQ(data_dict['Reshaped_readout'], 
                                                        angle=self[f'{r}/IQ_rotation_angle'])
             data_dict['GMMpredicted_readout'] = gmm_predict(data_dict['IQrotated_readout'], 
@@ -529,7 +516,7 @@ class ProcessManager(Config):
         mask_heralding = None
         if self['heralding'] is True:
             for r, data_dict in measurement.items():  
-                data_dict['Reshaped_heralding'] = np.array(data_dict['Heterodyned_heralding']).reshape(shape)
+                data_dict['Reshaped_heralding'] = np.asarray(data_dict['Heterodyned_heralding']).reshape(shape)
                 data_dict['IQrotated_heralding'] = rotate_IQ(data_dict['Reshaped_heralding'], 
                                                              angle=self[f'{r}/IQ_rotation_angle'])           
                 data_dict['GMMpredicted_heralding'] = gmm_predict(data_dict['IQrotated_heralding'], 
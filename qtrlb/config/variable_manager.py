@@ -42,40 +42,39 @@ class VariableManager(Config):
         ['Q0/01', 'Q0/12', 'Q1/01', 'Q1/ACStark', 'R0', 'R1a', 'R1b'].
         mod, out, seq are strings of integer represent the index of module, output port, sequencer.
         """
+        # Write into the nested dictionaries directly instead of walking config_dict by slashed key for each item.
+        # The range of mod_freq is checked once at the end, so that all bad tones are reported together.
         tones_list = []
+        mod_freqs = {}
+        lo_freq = self['lo_freq']
 
-        for qudit in self.keys():
+        for qudit, qudit_dict in self.items():
             if qudit.startswith('Q'):
-                for subtone, tone_dict in self[f'{qudit}'].items():
+                for subtone, tone_dict in qudit_dict.items():
                     # Add tone
                     tone = f'{qudit}/{subtone}'
                     tones_list.append(tone)
 
                     # Set mod, out, seq for convenience.
                     mod, out, seq = tone_dict['sequencer'].split('/')
-                    self.set(f'{tone}/mod', int(mod), which='dict')
-                    self.set(f'{tone}/out', int(out), which='dict')
-                    self.set(f'{tone}/seq', int(seq), which='dict')
+                    tone_dict['mod'], tone_dict['out'], tone_dict['seq'] = int(mod), int(out), int(seq)
 
                     # Check the DRAG_weight is in range.
                     assert -1 <= tone_dict['amp_180'] * tone_dict['DRAG_weight'] < 1, \
                         f'Varman: DRAG weight of {qudit}/{tone} is out of range.'
                     
                     # Set NCO frequency for each tone.
-                    mod_freq = self[f'{tone}/freq'] - self[f'lo_freq/M{mod}O{out}']
-                    assert -500*u.MHz < mod_freq < 500*u.MHz, f'Varman: mod_freq of {tone} is out of range.'
-                    self.set(f'{tone}/mod_freq', mod_freq, which='dict')
+                    tone_dict['mod_freq'] = mod_freqs[tone] = tone_dict['freq'] - lo_freq[f'M{mod}O{out}']
                     
                     # Set anharmonicity for each subspace.
                     # It can solve subspace like '910' and compare '02' with '01'.
                     if (not subtone.isdecimal()) or subtone == '01': continue
                     _, level_high = split_subspace(subtone)
-                    last_tone = f'{qudit}/{level_high - 2}{level_high - 1}'
-                    anharmonicity = self[f'{tone}/freq'] - self[f'{last_tone}/freq']
-                    self.set(f'{tone}/anharmonicity', anharmonicity, which='dict')
+                    last_subtone = f'{level_high - 2}{level_high - 1}'
+                    tone_dict['anharmonicity'] = tone_dict['freq'] - qudit_dict[last_subtone]['freq']
 
             elif qudit.startswith('R'):
-                for subtone, tone_dict in self[f'{qudit}'].items():
+                for subtone, tone_dict in qudit_dict.items():
                     if not 'sequencer' in tone_dict: continue
 
                     # Add tone
@@ -84,25 +83,24 @@ class VariableManager(Config):
 
                     # Set mod, out, seq for convenience.
                     mod, out, seq = tone_dict['sequencer'].split('/')
-                    self.set(f'{tone}/mod', int(mod), which='dict')
-                    self.set(f'{tone}/out', int(out), which='dict')
-                    self.set(f'{tone}/seq', int(seq), which='dict')
+                    tone_dict['mod'], tone_dict['out'], tone_dict['seq'] = int(mod), int(out), int(seq)
 
                     # Set NCO frequency for each tone.
-                    mod_freq = self[f'{tone}/freq'] - self[f'lo_freq/M{mod}O{out}']
-                    assert -500*u.MHz < mod_freq < 500*u.MHz, f'Varman: mod_freq of {tone} is out of range.'
-                    self.set(f'{tone}/mod_freq', mod_freq, which='dict')
+                    tone_dict['mod_freq'] = mod_freqs[tone] = tone_dict['freq'] - lo_freq[f'M{mod}O{out}']
 
                 # Make sure readout_levels are in ascending order.
-                self.set(f'{qudit}/readout_levels', sorted(self[f'{qudit}/readout_levels']), which='dict')
-                self.set(f'{qudit}/lowest_readout_levels', self[f'{qudit}/readout_levels'][0], which='dict')
-                self.set(f'{qudit}/highest_readout_levels', self[f'{qudit}/readout_levels'][-1], which='dict')
-                self.set(f'{qudit}/n_readout_levels', len(self[f'{qudit}/readout_levels']), which='dict')
+                readout_levels = sorted(qudit_dict['readout_levels'])
+                qudit_dict['readout_levels'] = readout_levels
+                qudit_dict['lowest_readout_levels'] = readout_levels[0]
+                qudit_dict['highest_readout_levels'] = readout_levels[-1]
+                qudit_dict['n_readout_levels'] = len(readout_levels)
 
             # Other common keys.
             else:
                 pass
 
+        out_of_range = [tone for tone, mod_freq in mod_freqs.items() if not -500*u.MHz < mod_freq < 500*u.MHz]
+        assert not out_of_range, f'Varman: mod_freq of {out_of_range} is out of range.'
         self.set('tones', tones_list, which='dict')
 
 
@@ -0,0 +1,194 @@
+# =============================================================================
+# Compiled kernels for the hot loops in processing.py.
+#
+# Numba is an optional dependency. When it is not installed, NUMBA_AVAILABLE
+# is False and the callers in processing.py fall back to their NumPy version,
+# so nothing here should be called directly without checking it first.
+#
+# Kernels work on flattened, C-contiguous arrays. Signatures are given
+# explicitly so the compilation happens at import instead of at the first
+# call inside a Scan. Kernels reading IQ data also have a float32 signature,
+# so float32 data is not upcast (and copied) before the call.
+# The GMM kernel is built per (n_components, n_features) instead, since these
+# are fixed by process.yaml and knowing them at compile time is much faster.
+# =============================================================================
+
+import numpy as np
+from functools import lru_cache
+try:
+    from numba import njit, prange, threading_layer
+    NUMBA_AVAILABLE = True
+except ModuleNotFoundError:
+    NUMBA_AVAILABLE = False
+
+
+if NUMBA_AVAILABLE:
+    @njit(['void(float64[::1], float64[::1], float64, float64, float64[::1], float64[::1])',
+           'void(float32[::1], float32[::1], float32, float32, float32[::1], float32[::1])'],
+          cache=True, fastmath=True, parallel=True)
+    def rotate_IQ_kernel(I_data, Q_data, cos_angle, sin_angle, I_out, Q_out):
+        """
+        Rotate each (I, Q) point by the angle whose cosine and sine are given.
+        Same as multiplying the 2x2 rotation matrix to every point.
+        """
+        for i in prange(I_data.shape[0]):
+            I_out[i] = cos_angle * I_data[i] - sin_angle * Q_data[i]
+            Q_out[i] = sin_angle * I_data[i] + cos_angle * Q_data[i]
+
+
+    @njit('boolean[::1](int64[:, ::1])', cache=True, parallel=True)
+    def heralding_mask_kernel(predictions):
+        """
+        Take GMM predicted levels with shape (n_resonators, n_points) and return mask with shape (n_points,).
+        The mask is False only if all resonators are in level 0 at that point.
+        """
+        mask = np.zeros(predictions.shape[1], dtype=np.bool_)
+        for j in prange(predictions.shape[1]):
+            for r in range(predictions.shape[0]):
+                if predictions[r, j] != 0:
+                    mask[j] = True
+                    break
+        return mask
+
+
+    def get_threading_layer() -> str:
+        """
+        Return the name of threading layer used by the parallel kernels, for example 'tbb', 'omp' or 'workqueue'.
+        Numba only chooses it at the first parallel call, so we run a tiny kernel here first.
+        The 'workqueue' layer aborts the interpreter if parallel kernels are called from several threads at once.
+        """
+        heralding_mask_kernel(np.zeros((1, 1), dtype=np.int64))
+        return threading_layer()
+
+
+    @lru_cache(maxsize=16)
+    def get_gmm_predict_diag_kernel(n_components: int, n_features: int):
+        """
+        Return a kernel predicting the component of each point for GMM with equal weights and diagonal covariances.
+        Data has shape (n_features, n_points), means and covariances have shape (n_components, n_features).
+        Same as the argmax of log-likelihood in GaussianMixture.predict(), including the log-determinant term.
+        Data can be float32, but the likelihood is always accumulated in float64.
+        n_components and n_features are compile-time constants of the returned kernel, so the inner loops are unrolled.
+        It is compiled once for each (n_components, n_features) and kept here.
+        """
+        @njit(['int64[::1](float64[:, ::1], float64[:, ::1], float64[:, ::1])',
+               'int64[::1](float32[:, ::1], float64[:, ::1], float64[:, ::1])'], parallel=True)
+        def gmm_predict_diag_kernel(data, means, covariances):
+            n_points = data.shape[1]
+
+            log_det = np.zeros(n_components)
+            for k in range(n_components):
+                for d in range(n_features):
+                    log_det[k] += np.log(covariances[k, d])
+
+            result = np.empty(n_points, dtype=np.int64)
+            for i in prange(n_points):
+                best_k = 0
+                best_log_prob = 0.0
+                for k in range(n_components):
+                    distance = 0.0
+                    for d in range(n_features):
+                        diff = data[d, i] - means[k, d]
+                        distance += diff * diff / covariances[k, d]
+                    log_prob = -0.5 * (distance + log_det[k])
+                    if k == 0 or log_prob > best_log_prob:
+                        best_k = k
+                        best_log_prob = log_prob
+                result[i] = best_k
+            return result
+
+        return gmm_predict_diag_kernel
+
+
+    @njit('int64[:, ::1](int64[:, ::1])', cache=True, parallel=True)
+    def trim_mask_kernel(mask):
+        """
+        Take mask with shape (n_reps, x_points) and flip the first few 0 of each column to 1, \
+        so that all columns have the same number of 0 as the column with fewest 0.
+        """
+        n_reps, n_points = mask.shape
+        n_pass = np.zeros(n_points, dtype=np.int64)
+        for i in prange(n_points):
+            for j in range(n_reps):
+                if mask[j, i] == 0:
+                    n_pass[i] += 1
+        n_pass_min = n_pass.min()
+
+        result = mask.copy()
+        for i in prange(n_points):
+            n_short = n_pass[i] - n_pass_min
+            j = 0
+            while n_short > 0:
+                if result[j, i] == 0:
+                    result[j, i] = 1
+                    n_short -= 1
+                j += 1
+        return result
+
+
+    @njit('int64[::1](float64[:, ::1])', cache=True, parallel=True)
+    def most_distant_pair_kernel(points):
+        """
+        Take points with shape (n_points, n_dimension) and return indices [i, j] of the most distant pair.
+        No (n_points, n_points) temporary is made. Each row keeps its own maximum, then we reduce them in order.
+        Ties give the first pair in itertools.combinations order, same as the NumPy version.
+        """
+        n_points, n_dimension = points.shape
+        row_max = np.full(n_points, -1.0)
+        row_argmax = np.zeros(n_points, dtype=np.int64)
+
+        for i in prange(n_points):
+            for j in range(i + 1, n_points):
+                squared_distance = 0.0
+                for d in range(n_dimension):
+                    diff = points[i, d] - points[j, d]
+                    squared_distance += diff * diff
+                if squared_distance > row_max[i]:
+                    row_max[i] = squared_distance
+                    row_argmax[i] = j
+
+        result = np.zeros(2, dtype=np.int64)
+        max_squared_distance = -1.0
+        for i in range(n_points):
+            if row_max[i] > max_squared_distance:
+                max_squared_distance = row_max[i]
+                result[0] = i
+                result[1] = row_argmax[i]
+        return result
+
+
+    @njit('int64[:, ::1](int64[:, ::1], boolean[:, ::1], boolean, int64, int64)', cache=True, parallel=True)
+    def population_count_kernel(data, valid, use_mask, level_min, n_bins):
+        """
+        Count each level of data with shape (n_reps, n_points) along n_reps in a single pass.
+        Return counts with shape (n_bins + 1, n_points).
+        Row k < n_bins counts the entries equal to level_min + k, and the last row counts all entries.
+        Only entries where valid is True are counted if use_mask, otherwise valid is not read.
+        Rows are split into blocks so that each thread reads data in memory order with its own counts.
+        """
+        n_reps, n_points = data.shape
+        n_blocks = min(n_reps, 64)
+        block_counts = np.zeros((n_blocks, n_bins + 1, n_points), dtype=np.int64)
+
+        for b in prange(n_blocks):
+            for i in range(b * n_reps // n_blocks, (b + 1) * n_reps // n_blocks):
+                for j in range(n_points):
+                    if use_mask and not valid[i, j]:
+                        continue
+                    block_counts[b, n_bins, j] += 1
+                    k = data[i, j] - level_min
+                    if 0 <= k < n_bins:
+                        block_counts[b, k, j] += 1
+
+        counts = np.zeros((n_bins + 1, n_points), dtype=np.int64)
+        for b in range(n_blocks):
+            counts += block_counts[b]
+        return counts
+
+
+else:
+    def get_threading_layer() -> None:
+        """
+        Without Numba there is no threading layer, and the NumPy fallbacks are safe to call from any thread.
+        """
+        return None
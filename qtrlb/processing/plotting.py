@@ -1,5 +1,6 @@
 import numpy as np
 import matplotlib as mpl
+from functools import lru_cache
 import qtrlb.utils.units as u
 import matplotlib.pyplot as plt 
 from scipy.stats import norm
@@ -102,13 +103,34 @@ COLOR_LIST = get_color_list()
 ##################################################
 # Plotting functions
 
+def get_IQ_limits(IQ: np.ndarray) -> tuple[tuple, tuple]:
+    """
+    Return the (xlim, ylim) covering all points of IQ data with shape (2, ...).
+    It reduces over all axes except the IQ axis, so each of min and max is a single call on the whole array.
+    """
+    IQ = np.asarray(IQ)
+    axes = tuple(range(1, IQ.ndim))
+    (left, bottom), (right, top) = np.min(IQ, axis=axes), np.max(IQ, axis=axes)
+    return (left, right), (bottom, top)
+
+
+@lru_cache(maxsize=32)
+def get_level_colormap(level_min: int, level_max: int) -> LSC:
+    """
+    Return the colormap covering COLOR_LIST from level_min to level_max.
+    It only depends on the two levels, so we build it once and share it between IQ plots.
+    """
+    return LSC.from_list('qtrlb', COLOR_LIST[level_min: level_max+1])
+
+
 def plot_IQ(ax: plt.Axes, I: np.ndarray, Q: np.ndarray, c: np.ndarray = None, **plot_setting):
     """
     Make scatter IQ plot with possible color and color map. Return the plt.Figure object.
     """
     if c is not None: 
-        cmap = LSC.from_list('qtrlb', COLOR_LIST[c.min(): c.max()+1])
-        c = (c - c.min()) / c.max()  # Normalize the color to [0, 1].
+        c_min, c_max = int(c.min()), int(c.max())
+        cmap = get_level_colormap(c_min, c_max)
+        c = (c - c_min) / c_max  # Normalize the color to [0, 1].
     else:
         cmap = None
     ax.scatter(I, Q, c=c, cmap=cmap, alpha=0.2)
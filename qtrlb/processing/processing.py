@@ -9,44 +9,93 @@
 # 
 # The input_data = np.array(input_data) not only guarantee the data format,
 # but also protect the original object and keep it unchanged.
+# Functions that only read their input use np.asarray instead, so the large
+# readout arrays are not copied on every call. Only trim_mask, correct_population
+# and find_most_distant_points still copy, since they modify or return their copy.
+# IQ data in float32 stays float32 through rotation and GMM prediction.
+# We don't cast float64 data down, since it is saved and used for calibration.
 #
 # All functions should support both Scan and Scan2D where the data for 1D has 
 # shape (2, n_reps, x_points) and Scan2D has shape (2, n_reps, y_points, x_points).
 # =============================================================================
 
+import math
 import numpy as np
 import matplotlib.pyplot as plt
-from itertools import combinations
+from functools import lru_cache
 from scipy.optimize import minimize
+from scipy.linalg import lu_factor, lu_solve
+from scipy.spatial import ConvexHull
 from sklearn.mixture import GaussianMixture
 from sklearn.mixture._gaussian_mixture import _compute_precision_cholesky
+from qtrlb.processing.kernels import NUMBA_AVAILABLE
+if NUMBA_AVAILABLE: from qtrlb.processing.kernels import rotate_IQ_kernel, heralding_mask_kernel, \
+    get_gmm_predict_diag_kernel, trim_mask_kernel, most_distant_pair_kernel, population_count_kernel
 PI = np.pi
 
 
-def rotate_IQ(input_data: list | np.ndarray, angle: float):
+def get_float_dtype(input_data: np.ndarray) -> np.dtype:
     """
-    Rotate all IQ data with angle in radian.
+    Return float32 for float32 data and float64 for everything else.
     """
-    input_data = np.array(input_data)
-    if angle < -2*PI or angle > 2*PI:
-        print(f'Processing: Rotate angle {angle} may not in radian!')
+    return np.dtype(np.float32) if input_data.dtype == np.float32 else np.dtype(np.float64)
+
+
+def rotate_IQ(input_data: list | np.ndarray, angle: float, out: np.ndarray = None):
+    """
+    Rotate all IQ data with angle in radian.
+    Use the compiled kernel when Numba is available, otherwise two multiply-adds in NumPy below.
+    Input is never modified, so ndarray (Reshaped_readout view for example) is used without copy.
+    If out is given, the result will be written into it and out will be returned.
+    It should have same shape as input_data, for example a slice of a preallocated multitone array.
+    If out shares memory with input_data, we rotate into a temporary array first and then copy it to out.
+    """
+    input_data = np.asarray(input_data)
+    if out is not None:
+        assert out.shape == input_data.shape, \
+            f'Processing: out should have shape {input_data.shape}, but got {out.shape}.'
+    assert -2*PI <= angle <= 2*PI, f'Processing: Rotate angle {angle} may not in radian!'
+    dtype = get_float_dtype(input_data)
+    cos_angle, sin_angle = dtype.type(math.cos(angle)), dtype.type(math.sin(angle))
         
-    rot_matrix = [[np.cos(angle), -np.sin(angle)], 
-                  [np.sin(angle), np.cos(angle)]]
-    
-    result = np.einsum('ij,j...->i...', rot_matrix, input_data)
+    if NUMBA_AVAILABLE and input_data.ndim >= 2 and input_data.shape[0] == 2 and input_data.size > 0:
+        flat_data = np.ascontiguousarray(input_data, dtype=dtype).reshape(2, -1)
+        # The kernel writes I_out[i] before reading I_data[i] for Q_out, so out can't overlap input.
+        if (out is not None and out.flags.c_contiguous and out.dtype == dtype
+                and not np.shares_memory(out, flat_data)):
+            result = out.reshape(2, -1)
+        else:
+            result = np.empty_like(flat_data)
+        rotate_IQ_kernel(flat_data[0], flat_data[1], cos_angle, sin_angle, result[0], result[1])
+        result = result.reshape(input_data.shape)
+    else:
+        # Same as applying [[cos, -sin], [sin, cos]] on first axis, without building the matrix for einsum.
+        assert input_data.ndim >= 1 and input_data.shape[0] == 2, 'Processing: First axis of data should be I and Q.'
+        flat_data = input_data.reshape(2, -1)
+        result = np.empty(flat_data.shape, dtype=np.result_type(flat_data, dtype))
+        np.multiply(flat_data[0], cos_angle, out=result[0])
+        result[0] -= sin_angle * flat_data[1]
+        np.multiply(flat_data[0], sin_angle, out=result[1])
+        result[1] += cos_angle * flat_data[1]
+        result = result.reshape(input_data.shape)
+
+    if out is not None and not np.shares_memory(result, out):
+        out[...] = result
+        return out
     return result
 
 
-def autorotate_IQ(input_data: list | np.ndarray, n_components: int):
+def autorotate_IQ(input_data: list | np.ndarray, n_components: int, out: np.ndarray = None):
     """
     Automatically rotate all IQ data based on most distance Gaussian blob.
+    The angle comes from the fit, so the rotation can't share a pass with it.
+    The rotation reads input_data without copy and writes into out if it is given, see rotate_IQ.
     """
-    input_data = np.array(input_data)
+    input_data = np.asarray(input_data)
     gmm = gmm_fit(input_data, n_components=n_components)
     points = find_most_distant_points(gmm.means_)
     angle = -1 * np.arctan2(points[0][1]-points[1][1], points[0][0]-points[1][0])
-    result = rotate_IQ(input_data, angle)
+    result = rotate_IQ(input_data, angle, out=out)
     return result
     
 
@@ -58,26 +107,71 @@ def gmm_predict(input_data: list | np.ndarray, means: list | np.ndarray, covaria
     Covariances should have shape (n_components,) for symmetrical distribution,
     where n_components is the number of Gaussian blob in IQ plane.
     The return values are always count from zero.
+    Diagonal and spherical covariances use a closed-form log-likelihood, compiled when Numba is available. \
+    Only other covariance types build a sklearn object.
     
     Reference:
     https://scikit-learn.org/stable/modules/generated/sklearn.mixture.GaussianMixture.html
     """
-    input_data = np.array(input_data)
-    means = np.array(means)
-    covariances = np.array(covariances)
+    input_data = np.asarray(input_data)
+    means = np.asarray(means)
+    covariances = np.asarray(covariances)
     n_components = len(means)
+
+    # Spherical covariance is diagonal covariance with same value for all features.
+    if covariance_type == 'spherical' and covariances.shape == (n_components,) and means.ndim == 2:
+        covariances = np.repeat(covariances[:, np.newaxis], means.shape[1], axis=1)
+    is_diagonal = covariance_type in ('diag', 'ellipsoidal', 'spherical') and covariances.shape == means.shape
+
+    # Compiled path for diagonal covariances, which is what we store in process.yaml.
+    if NUMBA_AVAILABLE and is_diagonal:
+        gmm_predict_diag_kernel = get_gmm_predict_diag_kernel(*means.shape)
+        result = gmm_predict_diag_kernel(
+            np.ascontiguousarray(input_data.reshape(input_data.shape[0], -1), dtype=get_float_dtype(input_data)),
+            np.ascontiguousarray(means, dtype=np.float64),
+            np.ascontiguousarray(covariances, dtype=np.float64)
+        )
+        return lowest_level + result.reshape(input_data.shape[1:])
+
+    # Same log-likelihood as the kernel, one component at a time to avoid (n_components, n_features, n_points) array.
+    if is_diagonal:
+        flat_data = input_data.reshape(input_data.shape[0], -1)
+        log_prob = np.empty((n_components, flat_data.shape[1]))
+        for k in range(n_components):
+            diff = flat_data - means[k][:, np.newaxis]
+            distance = np.einsum('ij,ij->j', diff / covariances[k][:, np.newaxis], diff)
+            log_prob[k] = -0.5 * (distance + np.sum(np.log(covariances[k])))
+        return lowest_level + np.argmax(log_prob, axis=0).reshape(input_data.shape[1:])
     
+    means = np.ascontiguousarray(means, dtype=np.float64)
+    covariances = np.ascontiguousarray(covariances, dtype=np.float64)
+    gmm = get_gmm_predictor(means.tobytes(), means.shape, covariances.tobytes(), covariances.shape, covariance_type)
+
+    result = lowest_level + gmm.predict(input_data.reshape(input_data.shape[0], -1).T).reshape(input_data.shape[1:])
+    # Magic reshape stealing from Ray.
+    return result
+
+ 
+@lru_cache(maxsize=32)
+def get_gmm_predictor(means_bytes: bytes, means_shape: tuple, covariances_bytes: bytes, covariances_shape: tuple,
+                      covariance_type: str) -> GaussianMixture:
+    """
+    Return a GaussianMixture with equal weights for given float64 bytes and shapes of means and covariances.
+    Same means and covariances are used on every Scan, so we only build it and compute its Cholesky once.
+    The returned object is shared, so please only call predict on it.
+    """
+    means = np.frombuffer(means_bytes).reshape(means_shape)
+    covariances = np.frombuffer(covariances_bytes).reshape(covariances_shape)
+    n_components = len(means)
+
     gmm = GaussianMixture(n_components, covariance_type=covariance_type)
     gmm.means_ = means
     gmm.covariances_ = covariances
     gmm.precisions_cholesky_ = _compute_precision_cholesky(covariances, covariance_type)
     gmm.weights_  = np.ones(n_components) / n_components
+    return gmm
 
-    result = lowest_level + gmm.predict(input_data.reshape(input_data.shape[0], -1).T).reshape(input_data.shape[1:])
-    # Magic reshape stealing from Ray.
-    return result
 
- 
 def gmm_fit(input_data, n_components: int, covariance_type: str = 'ellipsoidal', refine: bool = False,
             tol: float = 0.001, means: list | np.ndarray = None, covariances: list | np.ndarray = None):
     """
@@ -96,7 +190,7 @@ def gmm_fit(input_data, n_components: int, covariance_type: str = 'ellipsoidal',
     assert (refine is False) or (means is not None and covariances is not None), \
         'Processing: Need to specify means and covariance for refined GMM fitting.'
 
-    input_data = np.array(input_data)
+    input_data = np.asarray(input_data)
     gmm = GaussianMixture(n_components, covariance_type=covariance_type, tol=tol, warm_start=refine)
 
     if refine is True:
@@ -111,6 +205,20 @@ def gmm_fit(input_data, n_components: int, covariance_type: str = 'ellipsoidal',
     return gmm
 
 
+def single_gaussian_fit(input_data: list | np.ndarray, reg_covar: float = 1e-6) -> tuple[np.ndarray]:
+    """
+    Fit every IQ point of the input data with one Gaussian blob at same time.
+    The input_data should has shape (n_features, n_reps, ...) where n_features = 2 for single tone readout.
+    Return means and covariances with shape (..., n_features), one diagonal covariance for each point.
+    For n_components=1, GMM converges to the sample mean and variance (plus reg_covar) in a single step, \
+    so we don't need to run gmm_fit on each point.
+    """
+    input_data = np.asarray(input_data)
+    means = np.moveaxis(np.mean(input_data, axis=1), 0, -1)
+    covariances = np.moveaxis(np.var(input_data, axis=1), 0, -1) + reg_covar
+    return means, covariances
+
+
 def heralding_test(*input_data: tuple[np.ndarray], trim: bool = True) -> np.ndarray:
     """
     Generate the ndarray mask with shape (n_reps, x_points).
@@ -120,13 +228,18 @@ def heralding_test(*input_data: tuple[np.ndarray], trim: bool = True) -> np.ndar
     Otherwise the entries will be 1 and no other values.
     We then trim data to make sure all x_points has same amount of available repetition.
     Data trim doesn't Support 2D scan result.
+    The mask is computed by a compiled kernel in one pass when Numba is available.
     
     Note from Zihao(02/21/2023):
     The code here is stolen from original version of qtrl where we can only test ground state.
     However, ground state has most population and if our experiment need to start from |1>, pi pulse it.
     """
-    mask = 0
-    for data in input_data: mask = mask | (data != 0)
+    if NUMBA_AVAILABLE and len(input_data) > 0:
+        predictions = np.ascontiguousarray([np.asarray(data) for data in input_data], dtype=np.int64)
+        mask = heralding_mask_kernel(predictions.reshape(len(input_data), -1)).reshape(predictions.shape[1:])
+    else:
+        mask = 0
+        for data in input_data: mask = mask | (data != 0)
     mask = trim_mask(mask) if trim is True else mask
     return mask
 
@@ -141,27 +254,32 @@ def trim_mask(mask: list | np.ndarray) -> np.ndarray:
     This is old qtrlb code. I didn't change the core algorithm.
     Please make it better if you know how to do it.
     heralding_test is not the only place to use this function!!!
+
+    The old while loop flips the first few 0 of each column from top to bottom until it has n_pass_min of 0.
+    We now do exactly that with one compiled pass, or with cumulative count of 0 when Numba is not available.
     """
     mask = np.array(mask)
     assert len(mask.shape) == 2, 'Process: Do not support trim other than 2D data yet.'
 
-    n_pass_min = np.min(np.sum(mask == 0, axis=0))  
+    if NUMBA_AVAILABLE and mask.size > 0:
+        return trim_mask_kernel(np.ascontiguousarray(mask, dtype=np.int64)).astype(mask.dtype)
 
-    for i in range(mask.shape[1]):  # Loop over each x_point
-        j = 0
-        while np.sum(mask[:, i] == 0) > n_pass_min:
-            n_short = np.sum(mask[:, i] == 0) - n_pass_min
-            mask[j : j + n_short, i] = 1
-            j += n_short
+    passed = (mask == 0)
+    n_pass = np.sum(passed, axis=0)
+    n_flip = n_pass - np.min(n_pass)
+    mask[passed & (np.cumsum(passed, axis=0) <= n_flip)] = 1
     return mask
 
 
-def normalize_population(input_data, levels: list | np.ndarray, axis: int = 0, mask: np.ndarray = None):
+def normalize_population(input_data, levels: list | np.ndarray, axis: int = 0, mask: np.ndarray = None,
+                         out: np.ndarray = None):
     """
     Count population (specific interger) for different levels along a given axis.
     Return to normalized population (counts of appearing) with shape (n_levels, x_points).
     Allow a mask to pick entries in input_data to be normalized.
     Typically, the input_data and mask should have shape (n_reps, x_points).
+    If out is given, the result will be written into it and out will be returned.
+    It should have same shape as the result, for example a row or column of a preallocated matrix.
     
     Example: 
         n_reps=4, x_points=3, two level system, no mask.
@@ -172,9 +290,53 @@ def normalize_population(input_data, levels: list | np.ndarray, axis: int = 0, m
         Third x_point has 100% populaion in |0>, 0% in |1>.
     """
     # Zihao(02/17/2023): It's short, but still worth a function with clear explanation.
-    masked_data = np.ma.MaskedArray(input_data, mask=mask)
-    result = [np.mean(masked_data==level, axis=axis) for level in levels]
-    return np.array(result)
+    input_data = np.asarray(input_data)
+    levels_array = np.asarray(levels)
+    data = input_data.reshape(-1) if axis is None else np.moveaxis(input_data, axis, 0)
+    result_shape = () if axis is None else data.shape[1:]
+
+    if out is None:
+        out = np.empty((len(levels_array), *result_shape))
+    else:
+        assert out.shape == (len(levels_array), *result_shape), \
+            f'Processing: out should have shape {(len(levels_array), *result_shape)}, but got {out.shape}.'
+
+    # Compiled path counts all levels in one pass over data. It works on integer data and levels.
+    if (NUMBA_AVAILABLE and input_data.dtype.kind in 'iu' and levels_array.dtype.kind in 'iu'
+            and input_data.size > 0 and levels_array.size > 0):
+        level_min = int(levels_array.min())
+        n_bins = int(levels_array.max()) - level_min + 1
+
+        if mask is None:
+            valid = np.ones((1, 1), dtype=bool)  # Not read by kernel.
+        else:
+            valid = ~np.broadcast_to(np.asarray(mask, dtype=bool), input_data.shape)
+            valid = valid.reshape(-1) if axis is None else np.moveaxis(valid, axis, 0)
+            valid = np.ascontiguousarray(valid.reshape(data.shape[0], -1))
+
+        all_counts = population_count_kernel(np.ascontiguousarray(data.reshape(data.shape[0], -1), dtype=np.int64),
+                                             valid, mask is not None, level_min, n_bins)
+        n_valid = all_counts[-1].reshape(result_shape)
+        counts = all_counts[levels_array - level_min].reshape(out.shape)
+        out.fill(np.nan if len(result_shape) == 0 else 0.0)
+        return np.divide(counts, n_valid, out=out, where=(n_valid > 0))
+
+    if mask is None:
+        for k, level in enumerate(levels_array):
+            np.sum(data == level, axis=0, out=out[k, ...])
+        out /= data.shape[0]
+        return out
+
+    # Count with boolean mask instead of np.ma.MaskedArray, which is much slower.
+    # Same as np.ma, entries with nonzero mask are excluded, and fully masked points give 0 (nan for axis=None).
+    valid = np.broadcast_to(~np.asarray(mask, dtype=bool), input_data.shape)
+    valid = valid.reshape(-1) if axis is None else np.moveaxis(valid, axis, 0)
+    n_valid = np.count_nonzero(valid, axis=0).reshape(result_shape)
+    for k, level in enumerate(levels_array):
+        out[k, ...] = np.count_nonzero((data == level) & valid, axis=0).reshape(result_shape)
+    np.divide(out, n_valid, out=out, where=(n_valid > 0))
+    out[:, n_valid == 0] = np.nan if len(result_shape) == 0 else 0.0
+    return out
 
 
 def correct_population(input_data, corr_matrix: list | np.ndarray, corr_method: str = None):
@@ -189,18 +351,33 @@ def correct_population(input_data, corr_matrix: list | np.ndarray, corr_method:
     It's because np.linalg.solve only support this shape and more dimension cause ValueError.
     It's also because in least_squares, we need to manually loop over all other axis.
     When developing, keep mind to reshape the result back before return.
+
+    A stack of correction matrices with shape (*input_data.shape[1:], n_levels, n_levels) is also accepted, \
+    where each x/y point is corrected by its own matrix.
     """
     input_data = np.array(input_data)
     corr_matrix = np.array(corr_matrix)
     flat_data = input_data.reshape(input_data.shape[0], -1)
+    is_stack = corr_matrix.ndim > 2
+    if is_stack:
+        assert corr_matrix.shape[:-2] == input_data.shape[1:], \
+            'Processing: Stack of corr_matrix should have shape (*input_data.shape[1:], n_levels, n_levels).'
 
     # No correction.
     if corr_method is None:
         result = input_data
 
-    # Inverse correction matrix.
+    # Inverse correction matrix. Same as np.linalg.solve, but the LU factors of corr_matrix are cached.
+    # flat_data is a view of our own copy of input_data, so lu_solve can overwrite it.
+    # A stack of matrices is solved in one batched call, with each x/y point as a column vector.
+    elif corr_method == 'pseudo_inverse' and is_stack:
+        stacked_matrix = corr_matrix.reshape(-1, *corr_matrix.shape[-2:])
+        result = np.linalg.solve(stacked_matrix, flat_data.T[..., np.newaxis])[..., 0].T.reshape(input_data.shape)
+
     elif corr_method == 'pseudo_inverse':
-        result = np.linalg.solve(corr_matrix, flat_data).reshape(input_data.shape)
+        corr_matrix = np.ascontiguousarray(corr_matrix, dtype=np.float64)
+        lu_and_piv = get_lu_factor(corr_matrix.tobytes(), corr_matrix.shape)
+        result = lu_solve(lu_and_piv, flat_data, overwrite_b=True, check_finite=False).reshape(input_data.shape)
 
     # Least squares minimization without bounds.
     elif corr_method == 'least_squares':
@@ -209,10 +386,11 @@ def correct_population(input_data, corr_matrix: list | np.ndarray, corr_method:
 
         for j in range(flat_data.shape[-1]):
             predicted_population = flat_data[:, j]  # Population vector for single x/y point.
+            corr_matrix_j = corr_matrix.reshape(-1, *corr_matrix.shape[-2:])[j] if is_stack else corr_matrix
             x0 = np.random.rand(corr_matrix.shape[-1])  # Unnormalized initial guess.
 
             corrected_population[:, j] = minimize(
-                fun = lambda x: sum((np.dot(corr_matrix, x) - predicted_population) ** 2), 
+                fun = lambda x: sum((np.dot(corr_matrix_j, x) - predicted_population) ** 2), 
                 x0 = x0 / sum(x0), 
                 method = "SLSQP", 
                 constraints = {'type': 'eq', 'fun': lambda x: 1 - sum(x)}, 
@@ -227,6 +405,18 @@ def correct_population(input_data, corr_matrix: list | np.ndarray, corr_method:
     return result
 
 
+@lru_cache(maxsize=32)
+def get_lu_factor(corr_matrix_bytes: bytes, shape: tuple) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Return LU factors and pivots of a square matrix given by its float64 bytes and shape.
+    The corr_matrix in process.yaml rarely change, so each of them is only factorized once.
+    Raise LinAlgError for singular matrix, same as np.linalg.solve.
+    """
+    lu, piv = lu_factor(np.frombuffer(corr_matrix_bytes).reshape(shape), check_finite=False)
+    if np.any(np.diagonal(lu) == 0): raise np.linalg.LinAlgError('Singular matrix')
+    return lu, piv
+
+
 def sort_points_by_distance(points: np.ndarray, points_ref: np.ndarray) -> list:
     """
     Assuming we have two arrays of equal numbers of n-dimensional points, and their positions are close.
@@ -256,20 +446,74 @@ def find_most_distant_points(input_data):
     """
     Find the most distant points of data based on Euclidean distance.
     The input_data should has shape (n_points, n_dimension).
+    Return a tuple of the two points.
     
     Note from Zihao(02/20/2023):
         It's O(N^2) now. I know there is better way to do that. 
         Please do it if you know how.
-    """
-    input_data = np.array(input_data)  
-    max_distance = 0
-    for comb in combinations(input_data, 2):
-        distance = np.linalg.norm(comb[0]-comb[1])
-        if distance > max_distance:
-            max_distance = distance
-            points = comb
 
-    return points
+    For 2D data with enough points, we now take the convex hull and walk it with rotating calipers, \
+    which is O(N log N). The pair is mapped back to input order, so the point with smaller index comes first. \
+    With ties, the hull may pick a different pair than the old loop.
+    Few points, higher dimension or degenerate hull (all points on a line) still compare all pairs, \
+    with same result and tie-breaking as the old loop.
+    The Numba kernel does it when available, otherwise NumPy broadcasting.
+    """
+    input_data = np.array(input_data, dtype=float)
+
+    if input_data.ndim == 2 and input_data.shape[1] == 2 and input_data.shape[0] >= 8:
+        try:
+            vertices = ConvexHull(input_data).vertices
+        except RuntimeError:  # QhullError, usually because all points are on a line.
+            pass
+        else:
+            i, j = sorted(vertices[list(hull_diameter_indices(input_data[vertices]))])
+            return input_data[i], input_data[j]
+
+    # Compiled kernel compare all pairs without the (n_points, n_points) temporary, so it works for raw shots.
+    if NUMBA_AVAILABLE and input_data.ndim == 2 and input_data.shape[0] > 0:
+        i, j = most_distant_pair_kernel(np.ascontiguousarray(input_data))
+        return input_data[i], input_data[j]
+
+    # Squared distances of all pairs. Sqrt is not needed to find the maximum.
+    # The first maximum in upper triangle is the first pair in combinations order.
+    differences = input_data[:, np.newaxis, :] - input_data[np.newaxis, :, :]
+    squared_distances = np.triu(np.einsum('ijk,ijk->ij', differences, differences))
+    i, j = np.unravel_index(np.argmax(squared_distances), squared_distances.shape)
+    return input_data[i], input_data[j]
+
+
+def hull_diameter_indices(hull: np.ndarray) -> tuple[int, int]:
+    """
+    Find the indices of the two most distant vertices of a 2D convex polygon with rotating calipers.
+    The hull should has shape (n_vertices, 2) with vertices in counterclockwise order.
+    For each edge, the antipodal vertex j moves forward until the area it makes with that edge stops growing.
+    Then the diameter must be between one end of the edge and j.
+    """
+    n = len(hull)
+    x, y = hull[:, 0].tolist(), hull[:, 1].tolist()
+
+    def area(i, i_next, k):
+        # Twice the area of triangle (i, i_next, k).
+        return abs((x[i_next] - x[i]) * (y[k] - y[i]) - (y[i_next] - y[i]) * (x[k] - x[i]))
+
+    # Compare squared distances of plain floats. Sqrt is not needed to find the maximum.
+    max_squared_distance = -1.0
+    indices = (0, 0)
+    j = 1
+    for i in range(n):
+        i_next = (i + 1) % n
+        while area(i, i_next, (j + 1) % n) > area(i, i_next, j):
+            j = (j + 1) % n
+
+        for k in (i, i_next):
+            dx, dy = x[k] - x[j], y[k] - y[j]
+            squared_distance = dx * dx + dy * dy
+            if squared_distance > max_squared_distance:
+                max_squared_distance = squared_distance
+                indices = (k, j)
+
+    return indices
 
 
 def get_readout_fidelity(confusion_matrix: list | np.ndarray) -> float:
@@ -286,15 +530,24 @@ def get_readout_fidelity(confusion_matrix: list | np.ndarray) -> float:
         I then read carefully about how they actually do three level fidelity.
         It's really just mean of diagonal. You can try Fig.4(b) about 96.9%.
     """
-    fidelity = np.mean(np.diagonal(confusion_matrix))
+    fidelity = np.mean(get_state_fidelities(confusion_matrix))
     return float(fidelity)
 
 
+def get_state_fidelities(confusion_matrix: list | np.ndarray) -> np.ndarray:
+    """
+    Return the readout fidelity of each prepared state, which is P(predicted as state j | actually in state j).
+    Since vertical elements of the confusion matrix sum to 1, it's the diagonal.
+    The mean of it is the readout fidelity above.
+    """
+    return np.diagonal(np.asarray(confusion_matrix)).copy()
+
+
 def plot_corr_matrix(corr_matrix: list | np.ndarray) -> plt.Figure:
     """
     A pretty way to visualize correction matrix.
     """
-    corr_matrix = np.array(corr_matrix)
+    corr_matrix = np.asarray(corr_matrix)
     is_square = (corr_matrix.shape[0] == corr_matrix.shape[1])
 
     if is_square is True:
@@ -325,12 +578,12 @@ def get_QNDness_matrix(gmm_predict_0: list | np.ndarray,
     The levels are list of possible state assignment result of both readout.
     The row of returned matrix is assignment of Readout_0, the column is Readout_1.
     """
-    gmm_predict_0 = np.array(gmm_predict_0)
-    gmm_predict_1 = np.array(gmm_predict_1)
-    QNDness_matrix = np.array(
-        [normalize_population(gmm_predict_1, levels=levels, axis=None, mask=1-(gmm_predict_0==l)) 
-        for l in levels]
-    ).T
+    gmm_predict_0 = np.asarray(gmm_predict_0)
+    gmm_predict_1 = np.asarray(gmm_predict_1)
+    QNDness_matrix = np.empty((len(levels), len(levels)))
+    for i, l in enumerate(levels):
+        normalize_population(gmm_predict_1, levels=levels, axis=None, mask=1-(gmm_predict_0==l), 
+                             out=QNDness_matrix[:, i])
     return QNDness_matrix
 
 
@@ -338,7 +591,7 @@ def plot_QNDness_matrix(QNDness_matrix: list | np.ndarray) -> plt.Figure:
     """
     A pretty way to visualize QNDness matrix.
     """
-    QNDness_matrix = np.array(QNDness_matrix)
+    QNDness_matrix = np.asarray(QNDness_matrix)
 
     # Plot matrix in shaded orange color.
     fig, ax = plt.subplots(1, 1, figsize=(QNDness_matrix.shape[1], QNDness_matrix.shape[0]), dpi=400)
@@ -366,10 +619,10 @@ def two_tone_predict(input_data_0: list | np.ndarray,
     We will generate a mask to drop the data that has contradiction when normalizing it.
     The result and mask should have same shape as two input data.
     """
-    input_data_0 = np.array(input_data_0) 
-    input_data_1 = np.array(input_data_1)
-    levels_0 = np.array(levels_0)
-    levels_1 = np.array(levels_1)
+    input_data_0 = np.asarray(input_data_0) 
+    input_data_1 = np.asarray(input_data_1)
+    levels_0 = np.asarray(levels_0)
+    levels_1 = np.asarray(levels_1)
 
     # Find intersection and check it's unique.
     intersection = np.intersect1d(levels_0, levels_1)
@@ -405,10 +658,10 @@ def two_tone_normalize(input_data_0: list | np.ndarray,
     The later corr_matrix will be expected to have shape (16, 7)
     """
     
-    input_data_0 = np.array(input_data_0) 
-    input_data_1 = np.array(input_data_1)
-    levels_0 = np.array(levels_0)
-    levels_1 = np.array(levels_1)
+    input_data_0 = np.asarray(input_data_0) 
+    input_data_1 = np.asarray(input_data_1)
+    levels_0 = np.asarray(levels_0)
+    levels_1 = np.asarray(levels_1)
 
     # Find intersection and check it's unique.
     intersection = np.intersect1d(levels_0, levels_1)
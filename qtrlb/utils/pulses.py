@@ -1,6 +1,7 @@
 import numpy as np
 import pandas as pd
-from copy import deepcopy
+from collections import defaultdict
+from functools import lru_cache
 from warnings import simplefilter
 
 PI = np.pi
@@ -14,93 +15,117 @@ def dict_to_DataFrame(dic: dict, name: str, rows: list, padding: object = 'I'):
     """
     Turn a dictionary into a Pandas DataFrame with padding.
     Each key in dic or element in rows will become index (row) of the DataFrame.
-    Each column will be renamed as 'name_0', 'name_1'.
+    Each column will be named as 'name_0', 'name_1'.
+    The padding is done on the lists by pad_gate_dict, so pandas only construct the DataFrame once.
     
     Example:
         dict: {'Q3':['X180_01', 'X180_12'], 'Q4':['Y90_01']}
         name: 'pregate'
         rows: ['Q3', 'Q4', 'R3', 'R4']
     """
-    dic = deepcopy(dic)
-    for row in rows:
-        if row not in dic: dic[row] = []
-        
-    dataframe = pd.DataFrame.from_dict(dic, orient='index')
-    dataframe = dataframe.rename(columns={i:f'{name}_{i}' for i in range(dataframe.shape[1])})
-    dataframe = dataframe.fillna(padding)        
-    return dataframe
+    padded_dict = pad_gate_dict(dic, rows, padding)
+    n_columns = max((len(v) for v in padded_dict.values()), default=0)
+    columns = [f'{name}_{i}' for i in range(n_columns)]
+    return pd.DataFrame.from_dict(padded_dict, orient='index', columns=columns)
+
+
+def pad_gate_dict(dic: dict, rows: list, padding: object = 'I') -> dict[str: list]:
+    """
+    Pad a gate/pulse dictionary such that each row has same number of columns.
+    Each key in dic or element in rows will become a row (key) of the returned dictionary.
+    It's the light-weight version of dict_to_DataFrame that we use when building sequence.
+    
+    Example:
+        dict: {'Q3':['X180_01', 'X180_12'], 'Q4':['Y90_01']}
+        rows: ['Q3', 'Q4', 'R3', 'R4']
+        return: {'Q3':['X180_01', 'X180_12'], 'Q4':['Y90_01', 'I'], 'R3':['I', 'I'], 'R4':['I', 'I']}
+    """
+    n_columns = max((len(v) for v in dic.values()), default=0)
+    padded_dict = {row: [padding] * n_columns for row in rows}
 
+    for row, v in dic.items():
+        padded_dict[row] = list(v) + [padding] * (n_columns - len(v))
+    return padded_dict
 
-def gate_transpiler(gate_df: pd.DataFrame, tones: list) -> pd.DataFrame:
+
+def gate_transpiler(gate_dict: dict[str: list[str]], tones: list) -> dict[str: list[str]]:
     """
-    Take a gate pandas DataFrame and decompose it into different sequencers(tones).
-    Return a pulse DataFrame whose rows are tones.
-    Right now we assume pulse_df has same number of columns as gate_df where lengths can be reused.
+    Take a padded gate dictionary and decompose it into different sequencers(tones).
+    Return a padded pulse dictionary whose keys are tones.
+    Right now we assume pulse_dict has same number of columns as gate_dict where lengths can be reused.
     In future, we can pass in the length of the gate and decompose it into multiple consecutive pulse.
-    Then it will return to a DataFrame with more columns, where each of them may have a individual length.
+    Then it will return to a dictionary with more columns, where each of them may have a individual length.
 
     Parameters:
-        gate_df: A pandas DataFrame, see example below.
-        tones: A list of the row for the returned DataFrame.
+        gate_dict: A padded dictionary from pad_gate_dict, see example below.
+        tones: A list of the keys for the returned dictionary.
 
     Example:
-    gate_df = 
-           subspace_0 subspace_1 prepulse_0 prepulse_1 Readout
-        Q3    X180_01          I     Y90_01          I       I
-        Q4    X180_01    X180_12         H3     Z90_12       I
-        R3          I          I          I          I  RO_a_b
-        R4          I          I          I          I    RO_a
+    gate_dict = {
+        'Q3': ['X180_01',       'I', 'Y90_01',      'I',      'I'],
+        'Q4': ['X180_01', 'X180_12',     'H3', 'Z90_12',      'I'],
+        'R3': [      'I',       'I',      'I',      'I', 'RO_a_b'],
+        'R4': [      'I',       'I',      'I',      'I',   'RO_a']
+    }
 
     With tones = ['Q3/01', 'Q3/12', 'Q4/01', 'Q4/12', 'R3/a', 'R3/b', 'R4/a'], this function return it to
-
-              subspace_0 subspace_1 prepulse_0 prepulse_1 Readout
-        Q3/01       X180          I        Y90          I       I
-        Q3/12          I          I          I          I       I
-        Q4/01       X180          I      H3_01          I       I
-        Q4/12          I       X180      H3_12        Z90       I
-        R3/a           I          I          I          I      RO
-        R3/b           I          I          I          I      RO
-        R4/a           I          I          I          I      RO
+    {
+        'Q3/01': ['X180',    'I',   'Y90',   'I',  'I'],
+        'Q3/12': [   'I',    'I',     'I',   'I',  'I'],
+        'Q4/01': ['X180',    'I', 'H3_01',   'I',  'I'],
+        'Q4/12': [   'I', 'X180', 'H3_12', 'Z90',  'I'],
+        'R3/a':  [   'I',    'I',     'I',   'I', 'RO'],
+        'R3/b':  [   'I',    'I',     'I',   'I', 'RO'],
+        'R4/a':  [   'I',    'I',     'I',   'I', 'RO']
+    }
     """
+    n_columns = max((len(v) for v in gate_dict.values()), default=0)
+    pulse_dict = defaultdict(lambda: ['I'] * n_columns, {tone: ['I'] * n_columns for tone in tones})
 
-    pulse_df = dict_to_DataFrame(dic={}, name='', rows=tones)
-
-    # col_name is string, column is a Series.
-    for col_name in gate_df:
-        pulse_df[col_name] = 'I'  # Add empty column to pulse_df first. Then fill with pulse.
-        column = gate_df[col_name]
-
-        # Both row_name and row are string.
-        for row_name, gate in column.items():
+    # Both row_name and gate are string.
+    for row_name, row in gate_dict.items():
+        for i, gate in enumerate(row):
 
             if gate == 'I':
                 pass
 
             elif gate.startswith('RO'):
                 subtones = gate.split('_')
-                for subtone in subtones[1:]: pulse_df.loc[f'{row_name}/{subtone}', col_name] = 'RO'
+                for subtone in subtones[1:]: pulse_dict[f'{row_name}/{subtone}'][i] = 'RO'
 
             elif gate.startswith(('X', 'Y', 'Z')):
                 gate_str, subspace = gate.split('_')
-                pulse_df.loc[f'{row_name}/{subspace}', col_name] = gate_str
+                pulse_dict[f'{row_name}/{subspace}'][i] = gate_str
 
             elif gate.startswith('H3'):
-                pulse_df.loc[f'{row_name}/01', col_name] = f'{gate}_01'
-                pulse_df.loc[f'{row_name}/12', col_name] = f'{gate}_12'
+                pulse_dict[f'{row_name}/01'][i] = f'{gate}_01'
+                pulse_dict[f'{row_name}/12'][i] = f'{gate}_12'
 
             elif gate.startswith('D'):
                 nlevels = int(gate[1:])
                 for n in range(nlevels-1):
                     subspace = f'{n}{n+1}'
-                    pulse_df.loc[f'{row_name}/{subspace}', col_name] = f'{gate}_{subspace}'
+                    pulse_dict[f'{row_name}/{subspace}'][i] = f'{gate}_{subspace}'
 
             else:
                 raise ValueError(f"Pulses: Gate {gate} hasn't been defined.")
             
-    return pulse_df
+    return dict(pulse_dict)
+
 
 
 
+@lru_cache(maxsize=256)
+def idle_program(length: int) -> str:
+    """
+    Return the sequence program of identity pulse 'I' with length in [ns].
+    It's the most common pulse since all gate tables are padded by it, so the caller can skip pulse_interpreter.
+    """
+    # Must allow update parameters such that Z-I-Z-X make Z pulse works.
+    return '' if length == 0 else f"""
+                    upd_param        {length}
+        """
+
 
 def pulse_interpreter(cfg, tone: str, pulse_string: str, length: int, **pulse_kwargs) -> str:
     """
@@ -115,10 +140,7 @@ def pulse_interpreter(cfg, tone: str, pulse_string: str, length: int, **pulse_kw
     """
     
     if pulse_string == 'I':
-        # Must allow update parameters such that Z-I-Z-X make Z pulse works.
-        pulse_program = '' if length == 0 else f"""
-                    upd_param        {length}
-        """
+        pulse_program = idle_program(length)
         
     elif pulse_string == 'RO':
         if 'acq_index' not in pulse_kwargs:
@@ -127,8 +149,10 @@ def pulse_interpreter(cfg, tone: str, pulse_string: str, length: int, **pulse_kw
         else:
             acq_index = pulse_kwargs['acq_index']
         
-        freq = round(cfg.variables[f'{tone}/mod_freq'] * 4)
-        gain = round(cfg.variables[f'{tone}/amp'] * 32768)
+        tone_dict = cfg[f'variables.{tone}']
+
+        freq = round(tone_dict['mod_freq'] * 4)
+        gain = round(tone_dict['amp'] * 32768)
         tof_ns = round(cfg.variables['common/tof'] * 1e9)
         
         pulse_program = f"""
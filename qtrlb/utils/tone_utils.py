@@ -5,6 +5,7 @@
 # =============================================================================
 
 from collections.abc import Iterable
+from functools import lru_cache
 
 
 def compare_dict(dict_raw: dict, dict_template: dict, key: str = ''):
@@ -31,24 +32,39 @@ def tone_to_qudit(tone: str | Iterable) -> str | list:
     tone_to_qudit([['Q2/01', 'Q3/12', 'R2/a'], ['Q2/01', 'Q2/12', 'R2']]) -> [['Q2', 'Q3', 'R2'], ['Q2', 'R2']]
     """
     if isinstance(tone, str):
-        assert tone.startswith(('Q', 'R')), f'Cannot translate {tone} to qudit.'
-        try:
-            qudit, _ = tone.split('/')
-            return qudit
-        except ValueError:
-            return tone
+        return single_tone_to_qudit(tone)
         
     elif isinstance(tone, Iterable):
         qudit = []
+        seen = set()  # Only string qudit is hashable, nested list still check the list.
         for t in tone:
             q = tone_to_qudit(t)
-            if q not in qudit: qudit.append(q)
+            if isinstance(q, str):
+                if q in seen: continue
+                seen.add(q)
+            elif q in qudit: 
+                continue
+            qudit.append(q)
         return qudit
 
     else:
         raise TypeError(f'misc: Cannot translate the {tone}. Please check it type.')
 
 
+@lru_cache(maxsize=256)
+def single_tone_to_qudit(tone: str) -> str:
+    """
+    Translate a single tone string to qudit.
+    The set of tones is small and fixed by variables.yaml, so we cache the result.
+    """
+    assert tone.startswith(('Q', 'R')), f'Cannot translate {tone} to qudit.'
+    try:
+        qudit, _ = tone.split('/')
+        return qudit
+    except ValueError:
+        return tone
+
+
 def find_subtones(qudit: str, tones: Iterable) -> list:
     """
     Find all subtones in a tones list that is associated to a qudit string.
@@ -1,5 +1,7 @@
+import json
 import numpy as np
 import matplotlib.pyplot as plt
+from functools import lru_cache
 from numpy import exp, sin, cos
 PI = np.pi
 
@@ -18,16 +20,43 @@ def get_waveform(length: int, shape: str, **waveform_kwargs):
         2. have first/last data point as close to zero as possible.
         3. avoid steep change, especially on main waveform (derivative is fine).
     """
-    
+    return get_waveform_array(length, shape, **waveform_kwargs).tolist()
+
+
+def get_waveform_array(length: int, shape: str, **waveform_kwargs) -> np.ndarray:
+    """
+    Same as get_waveform, but return the ndarray without converting it to list.
+    """
     # Check the length is integer
     if int(length) != length:
         print(f'The waveform length {length} is not interger and will be rounded to {round(length)}.')
         length = round(length)
         
-    waveform = waveform_dict[shape](length, **waveform_kwargs).tolist()    
-    return waveform
+    return waveform_dict[shape](length, **waveform_kwargs)
     
 
+def get_waveform_cached(length: int, shape: str, **waveform_kwargs) -> np.ndarray:
+    """
+    Same as get_waveform_array, but remember the result for each (length, shape, waveform_kwargs).
+    Many tones usually share same pulse shape and length, so we only compute it once.
+    The returned ndarray is shared between callers and is read-only.
+    It is kept as ndarray until json serialization, see Scan.dump_sequence_json.
+    Kwargs that cannot be converted to json will skip the cache.
+    """
+    try:
+        waveform_kwargs_json = json.dumps(waveform_kwargs, sort_keys=True)
+    except TypeError:
+        return get_waveform_array(length, shape, **waveform_kwargs)
+    return _get_waveform_cached(length, shape, waveform_kwargs_json)
+
+
+@lru_cache(maxsize=64)
+def _get_waveform_cached(length: int, shape: str, waveform_kwargs_json: str) -> np.ndarray:
+    waveform = get_waveform_array(length, shape, **json.loads(waveform_kwargs_json))
+    waveform.flags.writeable = False
+    return waveform
+
+
 def plot_waveform(length: int, shape: str, **waveform_kwargs):
     """
     Plot waveform amplitude as time.